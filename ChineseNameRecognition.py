@@ -1,11 +1,9 @@
-﻿import hanlp
-import pandas as pd
+﻿import pandas as pd
 from collections import defaultdict
 
-# Load models
-recognizer = hanlp.load(hanlp.pretrained.ner.MSRA_NER_BERT_BASE_ZH)
-tokenizer = hanlp.load(hanlp.pretrained.tok.COARSE_ELECTRA_SMALL_ZH)
-sentence_segmenter = hanlp.load(hanlp.pretrained.mtl.CLOSE_TOK_POS_NER_SRL_DEP_SDP_CON_ELECTRA_SMALL_ZH)
+import novel_io
+import hanlp_models
+import sentence_segmenter
 
 def read_dictionary(file_path):
     mapping = {}
@@ -22,18 +20,6 @@ def read_dictionary(file_path):
 def translate_to_sino_vietnamese(chinese_name, dictionary):
     return ' '.join(dictionary.get(char, char) for char in chinese_name)
 
-def split_sentence(sentence, max_chars=126):
-    if len(sentence) <= max_chars:
-        return [sentence]
-    
-    # First, try to split by '，'
-    parts = sentence.split('，')
-    if max(len(part) for part in parts) <= max_chars:
-        return parts
-    
-    # If still too long, split by characters
-    return [sentence[i:i+max_chars] for i in range(0, len(sentence), max_chars)]
-
 def export_ner_results_to_excel(all_entities, dictionary, output_file='ner_results.xlsx'):
     # Dictionary to store entity information
     entity_info = defaultdict(lambda: {'category': '', 'appearances': 0})
@@ -75,59 +61,45 @@ def export_ner_results_to_excel(all_entities, dictionary, output_file='ner_resul
     df.to_excel(output_file, index=False, header=True)
     print(f"Results exported to {output_file}")
 
-# Read the dictionary file
-dictionary_mapping = read_dictionary('ChinesePhienAmWords.txt')
+def main():
+    # Models are loaded here, when the script runs, not when the module is imported
+    recognizer = hanlp_models.get_model('ner', 'MSRA_NER_BERT_BASE_ZH')
+    tokenizer = hanlp_models.get_model('tok', 'COARSE_ELECTRA_SMALL_ZH')
+    print(hanlp_models.describe())
 
-# Read the novel file
-encodings_to_try = ['utf-8', 'gbk', 'gb2312', 'big5', 'ascii']
-novel_text = ""
+    # Read the dictionary file
+    dictionary_mapping = read_dictionary('ChinesePhienAmWords.txt')
 
-for encoding in encodings_to_try:
+    # Read the novel file
     try:
-        with open('novel.txt', 'r', encoding=encoding) as file:
-            novel_text = file.read()
+        novel_text, encoding = novel_io.read_novel_text('novel.txt')
         print(f"Successfully read the file using {encoding} encoding.")
-        break
-    except UnicodeDecodeError:
-        print(f"Failed to read with {encoding} encoding.")
+    except ValueError:
+        print("Failed to read the file with any of the attempted encodings.")
+        return
 
-if not novel_text:
-    print("Failed to read the file with any of the attempted encodings.")
-    exit()
+    # Split the novel text into paragraphs
+    paragraphs = novel_text.split('\n')
 
-# Split the novel text into paragraphs
-paragraphs = novel_text.split('\n')
+    all_entities = []
 
-all_entities = []
+    # Process each paragraph
+    for paragraph in paragraphs:
+        # Sentences packed into model-sized segments, long ones split at clause boundaries
+        for segment in sentence_segmenter.iter_segments(paragraph):
+            tokens = tokenizer(segment)
+            if len(tokens) > 126:  # Double-check length
+                print(f"Warning: Segment still too long: {len(tokens)} tokens")
+                continue  # Skip this segment or further process it
+            entities = recognizer(tokens)
+            all_entities.append(entities)
 
-# Process each paragraph
-for paragraph in paragraphs:
-    # Split sentences using multiple punctuation marks
-    sentences = []
-    current_sentence = ""
-    for char in paragraph:
-        current_sentence += char
-        if char in ['。', '！', '？']:
-            sentences.append(current_sentence)
-            current_sentence = ""
-    if current_sentence:  # Add any remaining text as a sentence
-        sentences.append(current_sentence)
+            print("Segment:", segment)
+            print("Entities:", entities)
+            print()
 
-    for sentence in sentences:
-        if sentence:
-            # Split long sentences
-            segments = split_sentence(sentence)
-            for segment in segments:
-                tokens = tokenizer(segment)
-                if len(tokens) > 126:  # Double-check length
-                    print(f"Warning: Segment still too long: {len(tokens)} tokens")
-                    continue  # Skip this segment or further process it
-                entities = recognizer(tokens)
-                all_entities.append(entities)
-                
-                print("Segment:", segment)
-                print("Entities:", entities)
-                print()
+    # Export results to Excel
+    export_ner_results_to_excel(all_entities, dictionary_mapping, 'ner_results.xlsx')
 
-# Export results to Excel
-export_ner_results_to_excel(all_entities, dictionary_mapping, 'ner_results.xlsx')
\ No newline at end of file
+if __name__ == "__main__":
+    main()
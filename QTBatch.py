@@ -1,17 +1,25 @@
 import time
 import os
 import threading
-from typing import Dict, Any
+import argparse
+import multiprocessing
+from typing import Dict, Any, Optional
 import logging
 import opencc
 
 import QuickTranslator as qt
+import novel_io
+import hanlp_models
+from conversion_store import ConversionStore, dictionary_signature
 from gui import GUI
 from name_analyzer import HanLPAnalyzer, CATEGORY_TRANSLATION
+from ner_prefilter import SegmentPrefilter
+from name_miner import mine_names
 import dearpygui.dearpygui as dpg
 import config
-from utils import check_and_download_fonts, get_file_size_str, detect_chinese_script
+from utils import check_and_download_fonts, get_file_size_str, detect_chinese_script, FileWatcher
 from logging_config import setup_logging
+from profiling import profiler
 
 logger = setup_logging()
 
@@ -19,6 +27,9 @@ class QuickTranslatorGUI:
     def __init__(self):
         print("Initializing QuickTranslatorGUI...")
         self.novel_path: str = ""
+        self.novel_encoding: str = "utf-8"
+        self.names2_reload_lock = threading.Lock()
+        self.names2_watcher: Optional[FileWatcher] = None
         self.loading_info: Dict[str, Dict[str, Any]] = {
             "names2": {"loaded": False, "count": 0, "time": 0},
             "names": {"loaded": False, "count": 0, "time": 0},
@@ -72,19 +83,28 @@ class QuickTranslatorGUI:
             export_names_to_csv_callback=self.export_names_to_csv,
             csv_to_names2_callback=self.csv_to_names2,
             reanalyze_hanlp_callback=self.reanalyze_hanlp_analysis,
-            tc_to_sc_callback=self.tc_to_sc_conversion
+            tc_to_sc_callback=self.tc_to_sc_conversion,
+            mine_names_callback=self.mine_names
         )
         print("QuickTranslatorGUI initialized.")
 
     def load_data_in_background(self):
         print("Loading data in background...")
-        self.names2, self.names, self.viet_phrase, self.chinese_phien_am, self.loading_info = qt.load_data()
+        self.names2, self.names, self.viet_phrase, self.chinese_phien_am, self.loading_info = qt.load_data(
+            backend=config.DICTIONARY_BACKEND,
+            use_cache=config.DICTIONARY_CACHE,
+            parallel=config.DICTIONARY_PARALLEL_LOADING)
         if 'chinese_words' in self.loading_info:
             logging.info(f"Chinese words loaded: {self.loading_info['chinese_words']}")
         else:
             logging.warning("Chinese words data not found in loading_info")
         self.gui.update_status(self.loading_info)
         self.gui.set_conversion_data(self.names2, self.names, self.viet_phrase, self.chinese_phien_am)
+        if config.WATCH_NAMES2:
+            # Watcher reloads run off the render loop, so they must not drive a frame themselves
+            self.names2_watcher = FileWatcher(config.NAMES2_PATH, lambda: self.reload_names2(render=False),
+                                              config.WATCH_NAMES2_INTERVAL)
+            self.names2_watcher.start()
         print("Data loading completed.")
 
     def load_novel(self, sender: Any, app_data: Dict[str, Any]):
@@ -102,21 +122,29 @@ class QuickTranslatorGUI:
             return
 
         try:
-            novel_text, encoding = qt.read_novel_file(self.novel_path)
+            # Only the beginning is needed here; the full text is decoded once, by whoever needs it first
+            novel_head, encoding = novel_io.read_novel_head(self.novel_path, 1000)
+            self.novel_encoding = encoding
             novel_name = os.path.basename(self.novel_path)
             size_str = get_file_size_str(self.novel_path)
-            chinese_form = detect_chinese_script(novel_text[:1000])  # Detect script using the first 1000 characters
+            chinese_form = detect_chinese_script(novel_head)  # Detect script using the first 1000 characters
             self.gui.update_novel_status(novel_name, encoding, size_str, chinese_form)
-            self.gui.update_novel_preview(novel_text[:150])
+            self.gui.update_novel_preview(novel_head[:150])
             self.gui.update_conversion_status(f"Not started", (255, 165, 0))
             self.gui.update_conversion_time("")
             self.gui.update_conversion_progress(0.0)
             self.gui.update_conversion_percent(0.0, (220, 220, 220))
             self.gui.update_status_bar(f"Novel loaded: {novel_name}.")
-            self.gui.update_conversion_preview(novel_text[:150])
+            self.gui.update_conversion_preview(novel_head[:150])
 
             # Initialize HanLPAnalyzer
-            self.hanlp_analyzer = HanLPAnalyzer(self.novel_path, 'ChinesePhienAmWords.txt')
+            if self.hanlp_analyzer:
+                self.hanlp_analyzer.close_cache()
+            self.hanlp_analyzer = HanLPAnalyzer(self.novel_path, 'ChinesePhienAmWords.txt',
+                                               batch_size=config.HANLP_BATCH_SIZE,
+                                               workers=config.HANLP_WORKERS,
+                                               checkpoint_paragraphs=config.HANLP_CHECKPOINT_PARAGRAPHS,
+                                               checkpoint_seconds=config.HANLP_CHECKPOINT_SECONDS)
             
             # Load cache and update progress/status if available
             if self.hanlp_analyzer.load_cache():
@@ -129,10 +157,7 @@ class QuickTranslatorGUI:
                 self.gui.update_hanlp_progress(0.0)
                 initial_status = {category: 0 for category in CATEGORY_TRANSLATION.values()}
                 self.gui.update_name_analyzing_status(initial_status)
-                self.gui.update_status_bar("HanLP analyzer initialized. Loading models...")
-
-            # Start a thread to load HanLP models
-            threading.Thread(target=self.load_hanlp_models).start()
+                self.gui.update_status_bar("HanLP analyzer initialized.")
 
             print(f"Novel loaded: {novel_name}")
         except Exception as e:
@@ -141,31 +166,38 @@ class QuickTranslatorGUI:
             print(f"Error loading novel: {str(e)}")
 
     def load_hanlp_models(self):
+        self.gui.update_status_bar("Loading HanLP models...")
         self.hanlp_analyzer.load_models()
-        self.gui.update_status_bar("HanLP models loaded. Ready for analysis.")
+        self.gui.update_status_bar(hanlp_models.describe())
 
-    def reload_names2(self):
+    def reload_names2(self, render: bool = True):
         print("Reloading Names2...")
         start_time = time.time()
-        try:
-            with open(config.NAMES2_PATH, 'r', encoding='utf-8') as f:
-                name2_entries = [tuple(line.strip().split('=')) for line in f if len(line.strip().split('=')) == 2]
-            self.names2 = qt.Trie()
-            self.names2.batch_insert(name2_entries)
-            self.loading_info["names2"]["loaded"] = True
-            self.loading_info["names2"]["count"] = self.names2.count()
-            self.loading_info["names2"]["time"] = time.time() - start_time
-            logger.info(f"Reloaded {self.names2.count()} names from Names2.txt in {self.loading_info['names2']['time']:.2f} seconds")
-            self.gui.names2_reloaded = True
-            self.gui.update_status(self.loading_info)
-            self.gui.set_conversion_data(self.names2, self.names, self.viet_phrase, self.chinese_phien_am)
-            print(f"Names2 reloaded: {self.names2.count()} names")
-        except FileNotFoundError:
-            logger.warning("Names2.txt not found. Unable to reload.")
-            self.gui.update_status({"names2": {"loaded": False, "count": 0, "time": 0}})
-            print("Error: Names2.txt not found")
-        finally:
-            dpg.render_dearpygui_frame()
+        with self.names2_reload_lock:
+            try:
+                with open(config.NAMES2_PATH, 'r', encoding='utf-8') as f:
+                    name2_entries = dict(tuple(line.strip().split('=')) for line in f if len(line.strip().split('=')) == 2)
+                # Apply only the differences to the live trie; a running conversion keeps its matcher
+                current_entries = qt.snapshot_entries(self.names2)
+                changed = {word: value for word, value in name2_entries.items() if current_entries.get(word) != value}
+                removed = current_entries.keys() - name2_entries.keys()
+                qt.update_names2(self.names2, self.names, self.viet_phrase, changed, removed)
+                self.loading_info["names2"]["loaded"] = True
+                self.loading_info["names2"]["count"] = self.names2.count()
+                self.loading_info["names2"]["time"] = time.time() - start_time
+                logger.info(f"Reloaded Names2.txt in {self.loading_info['names2']['time']:.2f} seconds: "
+                            f"{len(changed)} added or changed, {len(removed)} removed, {self.names2.count()} names")
+                self.gui.names2_reloaded = True
+                self.gui.update_status(self.loading_info)
+                self.gui.set_conversion_data(self.names2, self.names, self.viet_phrase, self.chinese_phien_am)
+                print(f"Names2 reloaded: {self.names2.count()} names")
+            except FileNotFoundError:
+                logger.warning("Names2.txt not found. Unable to reload.")
+                self.gui.update_status({"names2": {"loaded": False, "count": 0, "time": 0}})
+                print("Error: Names2.txt not found")
+            finally:
+                if render:
+                    dpg.render_dearpygui_frame()
 
     def start_conversion(self):
         print("Starting conversion...")
@@ -192,8 +224,6 @@ class QuickTranslatorGUI:
         print("Running conversion...")
         start_time = time.time()
         try:
-            novel_text, encoding = qt.read_novel_file(self.novel_path)
-
             def progress_callback(progress):
                 if self.stop_conversion:
                     return True  # Signal to stop the conversion
@@ -201,22 +231,24 @@ class QuickTranslatorGUI:
                 self.gui.update_conversion_percent(progress)
                 return False  # Continue the conversion
 
-            converted_text = qt.process_novel(novel_text, self.names2, self.names, self.viet_phrase, self.chinese_phien_am, progress_callback)
-
-            if not self.stop_conversion:
-                converted_filename = qt.convert_filename(os.path.basename(self.novel_path), self.names2, self.names, self.viet_phrase, self.chinese_phien_am)
-                output_path = os.path.join(os.path.dirname(self.novel_path), converted_filename)
-
-                try:
-                    with open(output_path, 'w', encoding='utf-8') as f:
-                        f.write(converted_text)
-                except OSError as e:
-                    short_name = f"Converted_Novel_{int(time.time())}.txt"
-                    output_path = os.path.join(os.path.dirname(self.novel_path), short_name)
-                    with open(output_path, 'w', encoding='utf-8') as f:
-                        f.write(converted_text)
-                    logger.warning(f"Used shortened filename due to error: {e}")
-
+            converted_filename = qt.convert_filename(os.path.basename(self.novel_path), self.names2, self.names, self.viet_phrase, self.chinese_phien_am)
+            output_dir = os.path.dirname(self.novel_path)
+            store = None
+            if config.INCREMENTAL_CONVERSION:
+                store = ConversionStore(self.novel_path, self.names2, dictionary_signature(self.loading_info))
+            try:
+                output_path = qt.convert_file(self.novel_path, os.path.join(output_dir, converted_filename),
+                                              self.names2, self.names, self.viet_phrase, self.chinese_phien_am,
+                                              encoding=novel_io.detect_stream_encoding(self.novel_path),
+                                              progress_callback=progress_callback,
+                                              workers=config.CONVERSION_WORKERS,
+                                              fallback_output_path=os.path.join(output_dir, f"Converted_Novel_{int(time.time())}.txt"),
+                                              store=store)
+            finally:
+                if store is not None:
+                    store.close()
+
+            if output_path is not None:
                 end_time = time.time()
                 conversion_time = end_time - start_time
 
@@ -247,11 +279,14 @@ class QuickTranslatorGUI:
             print("HanLP analysis already running")
             return
 
-        if not self.hanlp_analyzer.is_ready():
-            self.gui.update_status_bar("HanLP models are still loading. Please wait.")
-            print("HanLP models are still loading. Please wait.")
-            return
+        dictionaries_loaded = not self.data_loading_thread.is_alive() and self.loading_info["viet_phrase"]["loaded"]
+        if config.HANLP_PREFILTER and dictionaries_loaded:
+            self.hanlp_analyzer.prefilter = SegmentPrefilter(self.names2, self.names, self.viet_phrase)
+        else:
+            self.hanlp_analyzer.prefilter = None
 
+        # Cleared here rather than in the thread, so a Stop pressed while the models load is kept
+        self.hanlp_analyzer.is_stopped = False
         self.hanlp_running = True
         self.hanlp_thread = threading.Thread(target=self.run_hanlp_analysis)
         self.hanlp_thread.start()
@@ -264,15 +299,28 @@ class QuickTranslatorGUI:
                 self.gui.update_hanlp_progress(progress)
                 status = self.hanlp_analyzer.get_status()
                 self.gui.update_name_analyzing_status(status)
-                estimated_time = (1 - progress) * (time.time() - start_time) / progress if progress > 0 else 0
+                # Only the progress made in this run says how fast the rest will go
+                progress_made = progress - start_progress
+                estimated_time = (1 - progress) * (time.time() - start_time) / progress_made if progress_made > 0 else 0
                 self.gui.update_hanlp_estimated_time(estimated_time)
                 print(f"HanLP analysis progress: {progress:.2f}")
 
+            # Worker processes of a sharded analysis load their own models
+            if self.hanlp_analyzer.workers == 1 and not self.hanlp_analyzer.is_ready():
+                self.load_hanlp_models()
+                if self.hanlp_analyzer.is_stopped:
+                    self.gui.update_status_bar("HanLP analysis stopped")
+                    print("HanLP analysis stopped")
+                    return
+
             start_time = time.time()
+            start_progress = self.hanlp_analyzer.progress
             self.hanlp_analyzer.analyze(progress_callback=progress_callback)
             
+            prefilter = self.hanlp_analyzer.prefilter
+            skipped = f" ({prefilter.skipped} of {prefilter.checked} sentences skipped by the pre-filter)" if prefilter else ""
             if not self.hanlp_analyzer.is_stopped:
-                self.gui.update_status_bar("HanLP analysis completed")
+                self.gui.update_status_bar(f"HanLP analysis completed{skipped}")
                 print("HanLP analysis completed")
             else:
                 self.gui.update_status_bar("HanLP analysis stopped")
@@ -314,11 +362,42 @@ class QuickTranslatorGUI:
             self.gui.update_status_bar("No HanLP analyzer initialized. Please load a novel first.")
             print("Error: No HanLP analyzer initialized. Please load a novel first.")
 
+    def mine_names(self):
+        print("Mining name candidates...")
+        if not self.hanlp_analyzer:
+            self.gui.update_status_bar("No novel loaded for name mining")
+            print("Error: No novel loaded for name mining")
+            return
+        threading.Thread(target=self.run_name_mining).start()
+
+    def run_name_mining(self):
+        try:
+            start_time = time.time()
+            novel_text, _ = novel_io.read_novel_text(self.novel_path)
+            is_known = None
+            if not self.data_loading_thread.is_alive() and self.loading_info["viet_phrase"]["loaded"]:
+                # VietPhrase translates names capitalized; a lowercase translation marks a common word
+                def is_known(word):
+                    value = qt.exact_lookup(self.viet_phrase, word)
+                    return value is not None and value[:1].islower()
+            candidates = mine_names(novel_text, is_known=is_known)
+            self.hanlp_analyzer.export_to_csv(config.MINED_NAMES_PATH, entity_info=candidates)
+            self.gui.set_names_csv_source("Quick Mine")
+            message = (f"Mined {len(candidates)} name candidates in {time.time() - start_time:.2f}s "
+                       f"and exported them to {config.MINED_NAMES_PATH}")
+            self.gui.update_status_bar(message)
+            print(message)
+        except Exception as e:
+            logger.error(f"Error mining names: {str(e)}")
+            self.gui.update_status_bar(f"Error mining names: {str(e)}")
+            print(f"Error mining names: {str(e)}")
+
     def export_names_to_csv(self):
         print("Exporting names to CSV...")
         if self.hanlp_analyzer:
             try:
-                self.hanlp_analyzer.export_to_csv()
+                self.hanlp_analyzer.export_to_csv(config.ANALYZED_NAMES_PATH)
+                self.gui.set_names_csv_source("HanLP analysis")
                 self.gui.update_status_bar("Names exported to CSV successfully")
                 print("Names exported to CSV successfully")
             except Exception as e:
@@ -329,13 +408,13 @@ class QuickTranslatorGUI:
             self.gui.update_status_bar("No HanLP analysis results to export")
             print("Error: No HanLP analysis results to export")
 
-    def csv_to_names2(self, minimum_appearances: int):
-        print(f"Converting CSV to Names2 with minimum appearances: {minimum_appearances}")
+    def csv_to_names2(self, minimum_appearances: int, csv_file: str = config.ANALYZED_NAMES_PATH):
+        print(f"Converting {csv_file} to Names2 with minimum appearances: {minimum_appearances}")
         if self.hanlp_analyzer:
             try:
-                self.hanlp_analyzer.export_to_names2(minimum_appearances)
-                self.gui.update_status_bar(f"CSV data converted to Names2.txt successfully (min appearances: {minimum_appearances})")
-                print(f"CSV data converted to Names2.txt successfully (min appearances: {minimum_appearances})")
+                self.hanlp_analyzer.export_to_names2(minimum_appearances, csv_file)
+                self.gui.update_status_bar(f"{csv_file} converted to Names2.txt successfully (min appearances: {minimum_appearances})")
+                print(f"{csv_file} converted to Names2.txt successfully (min appearances: {minimum_appearances})")
             except Exception as e:
                 logger.error(f"Error converting CSV to Names2: {str(e)}")
                 self.gui.update_status_bar(f"Error converting CSV to Names2: {str(e)}")
@@ -374,8 +453,19 @@ class QuickTranslatorGUI:
         self.gui.load_fonts()
         self.gui.update_status(self.loading_info)
         self.gui.run()
+        qt.shutdown_conversion_pool()
+        if self.hanlp_analyzer:
+            self.hanlp_analyzer.close_cache()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Dictionary loading spawns worker processes, also from the frozen exe
+    parser = argparse.ArgumentParser(description="QuickTranslator Batch")
+    parser.add_argument("--profile", action="store_true", help="Profile loading and conversion (also QTBATCH_PROFILE=1)")
+    parser.add_argument("--profile-output", help="Write aggregated pstats to this file at exit")
+    args, _ = parser.parse_known_args()
+    if args.profile or args.profile_output:
+        profiler.enable(args.profile_output)
+
     print("Starting QuickTranslatorGUI application...")
     gui = QuickTranslatorGUI()
     gui.run()
\ No newline at end of file
@@ -1,14 +1,30 @@
 import re
+import io
 import logging
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Iterator, Iterable, Callable
 from ReplaceChar import SPECIAL_CHARS
+import dictionary_cache
+import novel_io
+from profiling import profiler, profiled
 import time
 import os
-import cProfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import multiprocessing
+from array import array
+import sys
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+# Dictionary files larger than this are parsed in shards across processes when loading in parallel
+SHARD_MIN_BYTES = 8 * 1024 * 1024
 
 LATIN_CHARS = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
 
+# Dictionary precedence inside the merged matcher: Names2 > Names > VietPhrase
+PRIORITY_VIET_PHRASE = 0
+PRIORITY_NAMES = 1
+PRIORITY_NAMES2 = 2
+
 class TrieNode:
     __slots__ = ['children', 'is_end_of_word', 'value']
     def __init__(self):
@@ -20,6 +36,8 @@ class Trie:
     def __init__(self):
         self.root: TrieNode = TrieNode()
         self.word_count: int = 0
+        self.version: int = 0
+        self.max_key_length: int = 0
 
     def insert(self, word: str, value: str) -> None:
         current = self.root
@@ -27,57 +45,632 @@ class Trie:
             if char not in current.children:
                 current.children[char] = TrieNode()
             current = current.children[char]
+        if not current.is_end_of_word:
+            self.word_count += 1
         current.is_end_of_word = True
         current.value = value
-        self.word_count += 1
+        self.version += 1
+        self.max_key_length = max(self.max_key_length, len(word))
 
     def batch_insert(self, words: List[Tuple[str, str]]) -> None:
         for word, value in words:
             self.insert(word, value)
 
+    def get(self, word: str) -> Optional[str]:
+        current = self.root
+        for char in word:
+            current = current.children.get(char)
+            if current is None:
+                return None
+        return current.value if current.is_end_of_word else None
+
+    def update(self, word: str, value: str) -> bool:
+        """
+        Set the value of word, inserting it if missing.
+
+        :return: False if word already had this value (the version is left unchanged)
+        """
+        if self.get(word) == value:
+            return False
+        self.insert(word, value)
+        return True
+
+    def delete(self, word: str) -> bool:
+        """
+        Remove word and prune the nodes that no longer lead to any entry.
+
+        max_key_length is left as is; it only has to be an upper bound.
+
+        :return: Whether word was present
+        """
+        path = []
+        current = self.root
+        for char in word:
+            child = current.children.get(char)
+            if child is None:
+                return False
+            path.append((current, char))
+            current = child
+        if not current.is_end_of_word:
+            return False
+        current.is_end_of_word = False
+        current.value = None
+        for parent, char in reversed(path):
+            node = parent.children[char]
+            if node.is_end_of_word or node.children:
+                break
+            del parent.children[char]
+        self.word_count -= 1
+        self.version += 1
+        return True
+
     def count(self) -> int:
         return self.word_count
 
     def find_longest_prefix(self, text: str) -> Tuple[str, Optional[str]]:
-        current = self.root
-        longest_prefix = ""
+        length, value = self.find_longest_prefix_at(text, 0, len(text))
+        return text[:length], value
+
+    def find_longest_prefix_at(self, text: str, start: int, end: int) -> Tuple[int, Optional[str]]:
+        """Return (length, value) of the longest entry matching text[start:end], or (0, None)."""
+        children = self.root.children
+        longest_length = 0
         longest_value = None
-        prefix = []
-        for i, char in enumerate(text):
-            if char not in current.children:
+        i = start
+        while i < end:
+            node = children.get(text[i])
+            if node is None:
                 break
-            current = current.children[char]
-            prefix.append(char)
-            if current.is_end_of_word:
-                longest_prefix = ''.join(prefix)
-                longest_value = current.value
-        return longest_prefix, longest_value
-
-def profile_function(func):
-    def wrapper(*args, **kwargs):
-        pr = cProfile.Profile()
-        pr.enable()
-        result = func(*args, **kwargs)
-        pr.disable()
-        
-        stats = pr.getstats()
-        total_calls = sum(stat.callcount for stat in stats)
-        total_time = sum(stat.totaltime for stat in stats)
-        
-        logging.info(f"Performance profile for {func.__name__}:")
-        logging.info(f"Total function calls: {total_calls}")
-        logging.info(f"Total time: {total_time:.6f} seconds")
-        
-        return result
-    return wrapper
-
-@profile_function
-def load_data() -> Tuple[Trie, Trie, Trie, Dict[str, str], Dict[str, Dict[str, Any]]]:
-    names2 = Trie()
-    names = Trie()
-    viet_phrase = Trie()
-    chinese_phien_am: Dict[str, str] = {}
-    
+            i += 1
+            if node.is_end_of_word:
+                longest_length = i - start
+                longest_value = node.value
+            children = node.children
+        return longest_length, longest_value
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        stack = [(self.root, '')]
+        while stack:
+            node, word = stack.pop()
+            if node.is_end_of_word:
+                yield word, node.value
+            for char, child in node.children.items():
+                stack.append((child, word + char))
+
+class MatcherNode:
+    __slots__ = ['children', 'priority', 'value']
+    def __init__(self):
+        self.children: Dict[str, 'MatcherNode'] = {}
+        self.priority: int = -1
+        self.value: Optional[str] = None
+
+class MergedMatcher:
+    """
+    Single automaton holding Names2, Names and VietPhrase entries.
+
+    Every terminal node keeps the value of its highest-priority dictionary, so one
+    walk over the text reproduces the old "Names2, then Names, then VietPhrase"
+    cascade: a match from a higher-priority dictionary wins over any longer match
+    from a lower one, and within the same dictionary the longest match wins.
+    """
+    def __init__(self):
+        self.root: MatcherNode = MatcherNode()
+        self.word_count: int = 0
+        self.max_key_length: int = 0
+
+    def insert(self, word: str, value: str, priority: int) -> None:
+        current = self.root
+        for char in word:
+            child = current.children.get(char)
+            if child is None:
+                child = current.children[char] = MatcherNode()
+            current = child
+        if priority >= current.priority:
+            if current.priority < 0:
+                self.word_count += 1
+            current.priority = priority
+            current.value = value
+        self.max_key_length = max(self.max_key_length, len(word))
+
+    def count(self) -> int:
+        return self.word_count
+
+    @classmethod
+    def from_tries(cls, names2: 'Trie', names: 'Trie', viet_phrase: 'Trie') -> 'MergedMatcher':
+        matcher = cls()
+        # Insert lowest priority first so a later, higher-priority entry overrides it
+        for priority, trie in ((PRIORITY_VIET_PHRASE, viet_phrase), (PRIORITY_NAMES, names), (PRIORITY_NAMES2, names2)):
+            for word, value in trie.items():
+                matcher.insert(word, value, priority)
+        return matcher
+
+    def with_updates(self, updates: Dict[str, Tuple[Optional[str], int]]) -> 'MergedMatcher':
+        """
+        Return a matcher with some keys set to a new (value, priority), leaving this one untouched.
+
+        Only the nodes on the updated paths are copied and everything else is shared, so a
+        conversion still walking this matcher keeps a consistent view. A priority of -1
+        removes the key.
+
+        :param updates: key -> (winning value, its priority) after the change
+        """
+        matcher = MergedMatcher()
+        matcher.word_count = self.word_count
+        matcher.max_key_length = self.max_key_length
+        matcher.root = self._copy_node(self.root)
+        copied = {id(matcher.root)}
+        for word, (value, priority) in updates.items():
+            node = matcher.root
+            for char in word:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = MatcherNode()
+                elif id(child) not in copied:
+                    child = node.children[char] = self._copy_node(child)
+                copied.add(id(child))
+                node = child
+            matcher.word_count += (priority >= 0) - (node.priority >= 0)
+            node.priority = priority
+            node.value = value if priority >= 0 else None
+            matcher.max_key_length = max(matcher.max_key_length, len(word))
+        return matcher
+
+    @staticmethod
+    def _copy_node(node: MatcherNode) -> MatcherNode:
+        copy = MatcherNode()
+        copy.children = dict(node.children)
+        copy.priority = node.priority
+        copy.value = node.value
+        return copy
+
+    def match(self, text: str, start: int, end: int) -> Tuple[int, Optional[str], int]:
+        """Return (length, value, priority) of the winning match in text[start:end], or (0, None, -1)."""
+        children = self.root.children
+        best_length = 0
+        best_value = None
+        best_priority = -1
+        i = start
+        while i < end:
+            node = children.get(text[i])
+            if node is None:
+                break
+            i += 1
+            if node.priority >= 0 and node.priority >= best_priority:
+                best_length = i - start
+                best_value = node.value
+                best_priority = node.priority
+            children = node.children
+        return best_length, best_value, best_priority
+
+class ArrayTrie:
+    """
+    Immutable trie stored in a handful of contiguous arrays instead of one object per node.
+
+    Nodes are numbered breadth-first, so the children of a node are a contiguous run of
+    edges and edge e always leads to node e + 1:
+
+    - labels: one string holding every edge label, children of each node sorted
+    - children_start: node -> index of its first edge in labels (CSR layout, nodes + 1 entries)
+    - value_ids: node -> index into the value table, or -1 for non-terminal nodes
+    - values_blob / value_offsets: all values concatenated into one string
+    - priorities: optional value -> dictionary priority, used when the trie is a merged matcher
+
+    It offers the same lookup contract as Trie (find_longest_prefix, find_longest_prefix_at,
+    count, items) and, when built with priorities, the MergedMatcher.match contract.
+    """
+    def __init__(self, labels: str, children_start: array, value_ids: array, values_blob: str,
+                 value_offsets: array, priorities: Optional[array] = None, max_key_length: int = 0):
+        self.labels = labels
+        self.children_start = children_start
+        self.value_ids = value_ids
+        self.values_blob = values_blob
+        self.value_offsets = value_offsets
+        self.priorities = priorities
+        self.max_key_length = max_key_length
+        self.version = 0
+        # The root fans out to thousands of characters, so it gets a dict instead of a linear scan
+        self.root_children: Dict[str, int] = {labels[e]: e + 1 for e in range(children_start[0], children_start[1])}
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Tuple[str, str]], priorities: Optional[Iterable[int]] = None) -> 'ArrayTrie':
+        """
+        Build the trie from (key, value) pairs. Later duplicates win, as with Trie.insert.
+
+        When priorities are given (one per entry), the entry with the highest priority wins
+        for a key instead, and the result can be used as a merged matcher.
+        """
+        merged: Dict[str, Tuple[str, int]] = {}
+        if priorities is None:
+            for key, value in entries:
+                merged[key] = (value, 0)
+        else:
+            for (key, value), priority in zip(entries, priorities):
+                current = merged.get(key)
+                if current is None or priority >= current[1]:
+                    merged[key] = (value, priority)
+        merged.pop('', None)
+        keys = sorted(merged)
+
+        labels: List[str] = []
+        children_start = array('I', [0])
+        value_ids = array('i')
+        values: List[str] = []
+        value_priorities = array('b')
+        max_key_length = 0
+        # (lo, hi, depth): keys[lo:hi] share the first `depth` characters, one entry per node in BFS order
+        queue = deque([(0, len(keys), 0)])
+        edge_count = 0
+        while queue:
+            lo, hi, depth = queue.popleft()
+            if lo < hi and len(keys[lo]) == depth:
+                value, priority = merged[keys[lo]]
+                value_ids.append(len(values))
+                values.append(value)
+                value_priorities.append(priority)
+                max_key_length = max(max_key_length, depth)
+                lo += 1
+            else:
+                value_ids.append(-1)
+            group_start = lo
+            while group_start < hi:
+                char = keys[group_start][depth]
+                group_end = group_start + 1
+                while group_end < hi and keys[group_end][depth] == char:
+                    group_end += 1
+                labels.append(char)
+                queue.append((group_start, group_end, depth + 1))
+                edge_count += 1
+                group_start = group_end
+            children_start.append(edge_count)
+
+        value_offsets = array('I', [0])
+        offset = 0
+        for value in values:
+            offset += len(value)
+            value_offsets.append(offset)
+        return cls(''.join(labels), children_start, value_ids, ''.join(values), value_offsets,
+                   value_priorities if priorities is not None else None, max_key_length)
+
+    @classmethod
+    def from_sections(cls, sections: Dict[str, Any], max_key_length: int) -> 'ArrayTrie':
+        """Rebuild a trie from to_sections() output, e.g. memoryviews over a mapped cache file."""
+        return cls(sections["labels"], sections["children_start"], sections["value_ids"], sections["values_blob"],
+                   sections["value_offsets"], sections.get("priorities"), max_key_length)
+
+    def to_sections(self) -> Dict[str, Any]:
+        sections = {
+            "labels": self.labels,
+            "children_start": self.children_start,
+            "value_ids": self.value_ids,
+            "values_blob": self.values_blob,
+            "value_offsets": self.value_offsets,
+        }
+        if self.priorities is not None:
+            sections["priorities"] = self.priorities
+        return sections
+
+    @classmethod
+    def from_trie(cls, trie: 'Trie') -> 'ArrayTrie':
+        return cls.from_entries(trie.items())
+
+    @classmethod
+    def merge(cls, names2, names, viet_phrase) -> 'ArrayTrie':
+        """Array-backed equivalent of MergedMatcher.from_tries."""
+        entries: List[Tuple[str, str]] = []
+        priorities: List[int] = []
+        for priority, trie in ((PRIORITY_VIET_PHRASE, viet_phrase), (PRIORITY_NAMES, names), (PRIORITY_NAMES2, names2)):
+            for entry in trie.items():
+                entries.append(entry)
+                priorities.append(priority)
+        return cls.from_entries(entries, priorities)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Sections mapped from the dictionary cache are memoryviews, which cannot be pickled
+        state = self.__dict__.copy()
+        for name in ("children_start", "value_ids", "value_offsets", "priorities"):
+            if isinstance(state[name], memoryview):
+                state[name] = array(state[name].format, state[name].tobytes())
+        return state
+
+    def count(self) -> int:
+        return len(self.value_offsets) - 1
+
+    def value_at(self, value_id: int) -> str:
+        return self.values_blob[self.value_offsets[value_id]:self.value_offsets[value_id + 1]]
+
+    def _walk(self, text: str, start: int, end: int) -> Tuple[int, int]:
+        """Return (length, value_id) of the longest entry matching text[start:end], or (0, -1)."""
+        if start >= end:
+            return 0, -1
+        node = self.root_children.get(text[start])
+        if node is None:
+            return 0, -1
+        labels = self.labels
+        children_start = self.children_start
+        value_ids = self.value_ids
+        longest_length = 0
+        longest_id = -1
+        i = start + 1
+        while True:
+            value_id = value_ids[node]
+            if value_id >= 0:
+                longest_length = i - start
+                longest_id = value_id
+            if i >= end:
+                break
+            edge = labels.find(text[i], children_start[node], children_start[node + 1])
+            if edge < 0:
+                break
+            node = edge + 1
+            i += 1
+        return longest_length, longest_id
+
+    def find_longest_prefix(self, text: str) -> Tuple[str, Optional[str]]:
+        length, value = self.find_longest_prefix_at(text, 0, len(text))
+        return text[:length], value
+
+    def find_longest_prefix_at(self, text: str, start: int, end: int) -> Tuple[int, Optional[str]]:
+        length, value_id = self._walk(text, start, end)
+        if value_id < 0:
+            return 0, None
+        return length, self.value_at(value_id)
+
+    def match(self, text: str, start: int, end: int) -> Tuple[int, Optional[str], int]:
+        """MergedMatcher.match for a trie built with priorities."""
+        if start >= end:
+            return 0, None, -1
+        node = self.root_children.get(text[start])
+        if node is None:
+            return 0, None, -1
+        labels = self.labels
+        children_start = self.children_start
+        value_ids = self.value_ids
+        priorities = self.priorities
+        best_length = 0
+        best_id = -1
+        best_priority = -1
+        i = start + 1
+        while True:
+            value_id = value_ids[node]
+            if value_id >= 0 and priorities[value_id] >= best_priority:
+                best_length = i - start
+                best_id = value_id
+                best_priority = priorities[value_id]
+            if i >= end:
+                break
+            edge = labels.find(text[i], children_start[node], children_start[node + 1])
+            if edge < 0:
+                break
+            node = edge + 1
+            i += 1
+        if best_id < 0:
+            return 0, None, -1
+        return best_length, self.value_at(best_id), best_priority
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        stack = [(0, '')]
+        while stack:
+            node, word = stack.pop()
+            value_id = self.value_ids[node]
+            if value_id >= 0:
+                yield word, self.value_at(value_id)
+            for edge in range(self.children_start[node], self.children_start[node + 1]):
+                stack.append((edge + 1, word + self.labels[edge]))
+
+class LayeredMatcher:
+    """
+    Names2 matcher layered over an array-backed matcher of Names and VietPhrase.
+
+    Names2 has the highest priority, so wherever it matches, its longest match wins over
+    anything the base would find; the base is only walked where Names2 has no match. That
+    is the same result as one matcher over all three dictionaries, but a Names2 edit only
+    rebuilds the small overlay, and the base can be mapped from the dictionary cache.
+    """
+    def __init__(self, overlay: MergedMatcher, base: ArrayTrie):
+        self.overlay = overlay
+        self.base = base
+        self.max_key_length = max(overlay.max_key_length, base.max_key_length)
+
+    @classmethod
+    def from_tries(cls, names2: Trie, base: ArrayTrie) -> 'LayeredMatcher':
+        overlay = MergedMatcher()
+        for word, value in names2.items():
+            overlay.insert(word, value, PRIORITY_NAMES2)
+        return cls(overlay, base)
+
+    def count(self) -> int:
+        return self.overlay.count() + self.base.count()
+
+    def match(self, text: str, start: int, end: int) -> Tuple[int, Optional[str], int]:
+        result = self.overlay.match(text, start, end)
+        if result[0]:
+            return result
+        return self.base.match(text, start, end)
+
+# Guards the compiled matcher and in-place Names2 edits
+_matcher_lock = threading.Lock()
+_matcher_cache: Dict[str, Any] = {"sources": None, "matcher": None, "base_sources": None, "base": None}
+
+def _same_sources(cached, sources) -> bool:
+    return cached is not None and all(a is b and va == vb for (a, va), (b, vb) in zip(cached, sources))
+
+def get_matcher(names2: Trie, names: Trie, viet_phrase: Trie):
+    """
+    Return the merged matcher for these tries, recompiling only when one of them changed.
+
+    An array-backed VietPhrase gets a LayeredMatcher: Names2 over an ArrayTrie of Names and
+    VietPhrase, which is kept (or taken from prime_matcher) until one of those two changes.
+    """
+    sources = ((names2, names2.version), (names, names.version), (viet_phrase, viet_phrase.version))
+    with _matcher_lock:
+        if not _same_sources(_matcher_cache["sources"], sources):
+            start_time = time.time()
+            if isinstance(viet_phrase, ArrayTrie):
+                if not _same_sources(_matcher_cache["base_sources"], sources[1:]):
+                    _matcher_cache["base"] = ArrayTrie.merge(Trie(), names, viet_phrase)
+                    _matcher_cache["base_sources"] = sources[1:]
+                _matcher_cache["matcher"] = LayeredMatcher.from_tries(names2, _matcher_cache["base"])
+            else:
+                _matcher_cache["matcher"] = MergedMatcher.from_tries(names2, names, viet_phrase)
+            _matcher_cache["sources"] = sources
+            if profiler.enabled:
+                profiler.add_stage_time("compile_matcher", time.time() - start_time)
+            logging.info(f"Compiled merged matcher with {_matcher_cache['matcher'].count()} entries in {time.time() - start_time:.2f} seconds")
+        return _matcher_cache["matcher"]
+
+def exact_lookup(trie, word: str) -> Optional[str]:
+    """Value of exactly word in a Trie or ArrayTrie, or None."""
+    length, value = trie.find_longest_prefix_at(word, 0, len(word))
+    return value if word and length == len(word) else None
+
+def update_names2(names2: Trie, names: Trie, viet_phrase: Trie, changed: Dict[str, str], removed: Iterable[str]) -> None:
+    """
+    Apply Names2 edits to the live trie and to the compiled matcher.
+
+    A TrieNode-backed matcher is updated by copying only the edited paths, instead of being
+    recompiled from all three dictionaries. Conversions that already fetched the previous
+    matcher keep using it unchanged; the next get_matcher returns the updated one. A
+    LayeredMatcher gets a new Names2 overlay on the next get_matcher, over the same base.
+
+    :param changed: Added or revalued entries
+    :param removed: Keys no longer in Names2
+    """
+    with _matcher_lock:
+        cached = _matcher_cache["sources"]
+        current = ((names2, names2.version), (names, names.version), (viet_phrase, viet_phrase.version))
+        matcher = _matcher_cache["matcher"]
+        can_patch = (isinstance(matcher, MergedMatcher) and cached is not None and
+                     all(a is b and va == vb for (a, va), (b, vb) in zip(cached, current)))
+
+        touched = []
+        for word, value in changed.items():
+            if names2.update(word, value):
+                touched.append(word)
+        for word in removed:
+            if names2.delete(word):
+                touched.append(word)
+
+        if can_patch and touched:
+            updates: Dict[str, Tuple[Optional[str], int]] = {}
+            for word in touched:
+                # The key now resolves to the highest-priority dictionary that still has it
+                for priority, trie in ((PRIORITY_NAMES2, names2), (PRIORITY_NAMES, names), (PRIORITY_VIET_PHRASE, viet_phrase)):
+                    value = exact_lookup(trie, word)
+                    if value is not None:
+                        updates[word] = (value, priority)
+                        break
+                else:
+                    updates[word] = (None, -1)
+            _matcher_cache["matcher"] = matcher.with_updates(updates)
+            _matcher_cache["sources"] = ((names2, names2.version), (names, names.version), (viet_phrase, viet_phrase.version))
+        logging.info(f"Applied {len(touched)} Names2 changes{' to the compiled matcher' if can_patch and touched else ''}")
+
+def snapshot_entries(trie) -> Dict[str, str]:
+    """Copy the entries of a dictionary that update_names2 may be editing on another thread."""
+    with _matcher_lock:
+        return dict(trie.items())
+
+def prime_matcher(names: ArrayTrie, viet_phrase: ArrayTrie, base: ArrayTrie) -> None:
+    """Install an already compiled Names + VietPhrase base (e.g. from the dictionary cache) for these tries."""
+    with _matcher_lock:
+        _matcher_cache["base_sources"] = ((names, names.version), (viet_phrase, viet_phrase.version))
+        _matcher_cache["base"] = base
+
+def parse_dictionary_file(file_name: str, split_values: bool = False) -> List[Tuple[str, str]]:
+    entries = []
+    with open(file_name, 'r', encoding='utf-8') as f:
+        for line in f:
+            parse_dictionary_line(line, split_values, entries)
+    return entries
+
+def parse_dictionary_line(line: str, split_values: bool, entries: List[Tuple[str, str]]) -> None:
+    parts = line.strip().split('=')
+    if len(parts) == 2:
+        key, value = parts
+        if split_values:
+            first_value = value.replace("|", "/").split("/")[0]
+            entries.append((key, first_value))
+        else:
+            entries.append((key, value))
+
+def parse_dictionary_range(file_name: str, split_values: bool, start: int, end: int) -> List[Tuple[str, str]]:
+    """Parse the lines in bytes [start, end) of a dictionary file. Runs in worker processes."""
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # Same line splitting as text mode with universal newlines
+    text = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    entries: List[Tuple[str, str]] = []
+    for line in text.split('\n'):
+        parse_dictionary_line(line, split_values, entries)
+    return entries
+
+def parse_dictionary_file_sharded(file_name: str, split_values: bool = False, workers: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    Parse a large dictionary file in newline-aligned byte shards across worker processes.
+
+    Small files are parsed in-process, since starting the pool would cost more than it saves.
+    The workers are spawned rather than forked, because load_data calls this from one of
+    several loader threads, and a child forked while a sibling holds a lock inherits it held.
+    """
+    file_size = os.path.getsize(file_name)
+    workers = workers or os.cpu_count() or 1
+    if file_size < SHARD_MIN_BYTES or workers < 2:
+        return parse_dictionary_file(file_name, split_values)
+
+    boundaries = [0]
+    with open(file_name, 'rb') as f:
+        for shard in range(1, workers):
+            f.seek(max(file_size * shard // workers, boundaries[-1]))
+            f.readline()
+            boundaries.append(min(f.tell(), file_size))
+    boundaries.append(file_size)
+    ranges = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+    entries: List[Tuple[str, str]] = []
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(parse_dictionary_range, file_name, split_values, start, end) for start, end in ranges]
+        # Concatenate in file order so later duplicates still win
+        for future in futures:
+            entries.extend(future.result())
+    return entries
+
+def load_cached_array_trie(cache_name: str, source_paths: List[str], params: Dict[str, Any],
+                           build: Callable[[], ArrayTrie]) -> Tuple[ArrayTrie, bool]:
+    """
+    Map a compiled ArrayTrie from the dictionary cache, or build and cache it when the sources changed.
+
+    Returns the trie and whether it came from the cache.
+    """
+    cached = dictionary_cache.load(cache_name, source_paths, params)
+    if cached is not None:
+        sections, meta = cached
+        return ArrayTrie.from_sections(sections, meta["max_key_length"]), True
+    array_trie = build()
+    dictionary_cache.save(cache_name, source_paths, params, array_trie.to_sections(),
+                          {"max_key_length": array_trie.max_key_length})
+    return array_trie, False
+
+@profiled
+def load_data(backend: str = "trie", use_cache: bool = False, parallel: bool = False) -> Tuple[Trie, Trie, Trie, Dict[str, str], Dict[str, Dict[str, Any]]]:
+    """
+    Load the dictionaries from the working directory.
+
+    backend="array" stores Names and VietPhrase as immutable ArrayTries, which use a
+    fraction of the memory of TrieNode chains. Names2 always stays a Trie because it
+    is rebuilt by reload_names2.
+
+    use_cache=True keeps compiled dictionaries under caches/dictionaries and reuses them
+    while the .txt sources are unchanged. It only applies to the array backend, whose cached
+    arrays and Names + VietPhrase matcher are memory-mapped directly, so only the small
+    Names2 matcher is built (see LayeredMatcher). A TrieNode
+    trie would have to be rebuilt entry by entry from the cache, which is no faster than
+    parsing the .txt file, so the trie backend always parses.
+
+    parallel=True loads the four files concurrently and shards the parsing of large files
+    (VietPhrase in practice) across processes. Only the parsing runs in parallel: building
+    the tries holds the GIL, so the gain is limited to the parse and needs several cores.
+    """
     loading_info: Dict[str, Dict[str, Any]] = {
         "names2": {"loaded": False, "count": 0, "time": 0},
         "names": {"loaded": False, "count": 0, "time": 0},
@@ -85,127 +678,293 @@ def load_data() -> Tuple[Trie, Trie, Trie, Dict[str, str], Dict[str, Dict[str, A
         "viet_phrase": {"loaded": False, "count": 0, "time": 0}
     }
 
-    def load_file(file_name: str, trie: Trie, info_key: str, split_values: bool = False):
+    def parse(file_name: str, split_values: bool = False) -> List[Tuple[str, str]]:
+        if parallel:
+            return parse_dictionary_file_sharded(file_name, split_values)
+        return parse_dictionary_file(file_name, split_values)
+
+    def load_file(file_name: str, info_key: str, split_values: bool = False, backend: str = "trie"):
+        trie = Trie()
         try:
             start_time = time.time()
-            with open(file_name, 'r', encoding='utf-8') as f:
-                entries = []
-                for line in f:
-                    parts = line.strip().split('=')
-                    if len(parts) == 2:
-                        key, value = parts
-                        if split_values:
-                            first_value = value.replace("|", "/").split("/")[0]
-                            entries.append((key, first_value))
-                        else:
-                            entries.append((key, value))
-            trie.batch_insert(entries)
+            loading_info[info_key]["source"] = dictionary_cache.fingerprint(file_name)
+            from_cache = False
+            if use_cache and backend == "array":
+                trie, from_cache = load_cached_array_trie(
+                    info_key, [file_name], {"split_values": split_values},
+                    lambda: ArrayTrie.from_entries(parse(file_name, split_values)))
+            else:
+                entries = parse(file_name, split_values)
+                if backend == "array":
+                    trie = ArrayTrie.from_entries(entries)
+                else:
+                    trie.batch_insert(entries)
             loading_info[info_key]["loaded"] = True
             loading_info[info_key]["count"] = trie.count()
             loading_info[info_key]["time"] = time.time() - start_time
-            logging.info(f"Loaded {trie.count()} entries from {file_name} in {loading_info[info_key]['time']:.2f} seconds")
+            loading_info[info_key]["cached"] = from_cache
+            logging.info(f"Loaded {trie.count()} entries from {file_name}{' (cache)' if from_cache else ''} in {loading_info[info_key]['time']:.2f} seconds")
         except FileNotFoundError:
             logging.error(f"{file_name} not found. Proceeding without {info_key} data.")
         except Exception as e:
             logging.error(f"Error loading {file_name}: {str(e)}")
+        return trie
 
-    # Load Names2.txt
-    load_file('Names2.txt', names2, "names2")
+    def load_chinese_words() -> Dict[str, str]:
+        chinese_phien_am: Dict[str, str] = {}
+        try:
+            start_time = time.time()
+            loading_info["chinese_words"]["source"] = dictionary_cache.fingerprint('ChinesePhienAmWords.txt')
+            from_cache = False
+            if use_cache and backend == "array":
+                array_trie, from_cache = load_cached_array_trie(
+                    "chinese_words", ['ChinesePhienAmWords.txt'], {},
+                    lambda: ArrayTrie.from_entries(parse_dictionary_file('ChinesePhienAmWords.txt')))
+                chinese_phien_am = dict(array_trie.items())
+            else:
+                chinese_phien_am = dict(parse_dictionary_file('ChinesePhienAmWords.txt'))
+            loading_info["chinese_words"]["loaded"] = True
+            loading_info["chinese_words"]["count"] = len(chinese_phien_am)
+            loading_info["chinese_words"]["time"] = time.time() - start_time
+            loading_info["chinese_words"]["cached"] = from_cache
+            logging.info(f"Loaded {len(chinese_phien_am)} Chinese words in {loading_info['chinese_words']['time']:.2f} seconds")
+        except FileNotFoundError:
+            logging.error("ChinesePhienAmWords.txt not found.")
+        except Exception as e:
+            logging.error(f"Error loading ChinesePhienAmWords.txt: {str(e)}")
+        return chinese_phien_am
 
-    # Load Names.txt with split_values=True
-    load_file('Names.txt', names, "names", split_values=True)
+    if parallel:
+        # Each loader only touches its own loading_info entry, so they can run side by side
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            viet_phrase_future = executor.submit(load_file, 'VietPhrase.txt', "viet_phrase", True, backend)
+            names_future = executor.submit(load_file, 'Names.txt', "names", True, backend)
+            names2_future = executor.submit(load_file, 'Names2.txt', "names2")
+            chinese_words_future = executor.submit(load_chinese_words)
+            names2 = names2_future.result()
+            names = names_future.result()
+            chinese_phien_am = chinese_words_future.result()
+            viet_phrase = viet_phrase_future.result()
+    else:
+        # Load Names2.txt
+        names2 = load_file('Names2.txt', "names2")
 
-    # Load ChinesePhienAmWords.txt
-    try:
-        start_time = time.time()
-        with open('ChinesePhienAmWords.txt', 'r', encoding='utf-8') as f:
-            chinese_phien_am = dict(line.strip().split('=') for line in f if len(line.strip().split('=')) == 2)
-        loading_info["chinese_words"]["loaded"] = True
-        loading_info["chinese_words"]["count"] = len(chinese_phien_am)
-        loading_info["chinese_words"]["time"] = time.time() - start_time
-        logging.info(f"Loaded {len(chinese_phien_am)} Chinese words in {loading_info['chinese_words']['time']:.2f} seconds")
-    except FileNotFoundError:
-        logging.error("ChinesePhienAmWords.txt not found.")
-    except Exception as e:
-        logging.error(f"Error loading ChinesePhienAmWords.txt: {str(e)}")
-
-    # Load VietPhrase.txt with split_values=True
-    load_file('VietPhrase.txt', viet_phrase, "viet_phrase", split_values=True)
+        # Load Names.txt with split_values=True
+        names = load_file('Names.txt', "names", split_values=True, backend=backend)
+
+        # Load ChinesePhienAmWords.txt
+        chinese_phien_am = load_chinese_words()
+
+        # Load VietPhrase.txt with split_values=True
+        viet_phrase = load_file('VietPhrase.txt', "viet_phrase", split_values=True, backend=backend)
+
+    # Map the compiled Names + VietPhrase matcher as well, so the first conversion only builds the Names2 overlay
+    if use_cache and backend == "array" and all(loading_info[key]["loaded"] for key in ("names", "viet_phrase")):
+        try:
+            start_time = time.time()
+            base, from_cache = load_cached_array_trie(
+                "base_matcher", ['Names.txt', 'VietPhrase.txt'], {},
+                lambda: ArrayTrie.merge(Trie(), names, viet_phrase))
+            prime_matcher(names, viet_phrase, base)
+            logging.info(f"Prepared merged matcher{' (cache)' if from_cache else ''} in {time.time() - start_time:.2f} seconds")
+        except Exception as e:
+            logging.error(f"Error preparing merged matcher: {str(e)}")
 
     return names2, names, viet_phrase, chinese_phien_am, loading_info
 
 def read_novel_file(file_path: str) -> Tuple[str, str]:
-    encodings_to_try = ['utf-8', 'gbk', 'gb2312', 'big5']
-    for encoding in encodings_to_try:
-        try:
-            with open(file_path, 'r', encoding=encoding) as file:
-                novel_text = file.read()
-            logging.info(f"Successfully read the novel file using {encoding} encoding.")
-            return novel_text, encoding
-        except UnicodeDecodeError:
-            logging.warning(f"Failed to read with {encoding} encoding.")
-    raise ValueError("Unable to read the novel file with any of the attempted encodings.")
-
-def replace_special_chars(text: str) -> str:
-    for han, viet in SPECIAL_CHARS.items():
+    return novel_io.read_novel_text(file_path)
+
+def sequential_replace(text: str, replacements: Iterable[Tuple[str, str]]) -> str:
+    """Reference implementation: one str.replace pass per entry, in order."""
+    for han, viet in replacements:
         text = text.replace(han, viet)
     return text
 
-@profile_function
+def build_special_char_normalizer(special_chars: Dict[str, str]) -> Callable[[str], str]:
+    """
+    Compile a replacement mapping into a single-pass normalizer equivalent to applying
+    str.replace for every entry in order.
+
+    Multi-character keys (e.g. "､ ") are rare, so they keep their own str.replace pass, in
+    order and up front. Every single-character key is then replaced in one pass of a
+    character-class regex. Each table value is the entry's value with all later entries
+    already applied, so chains like a -> b, b -> c still give what the sequential passes
+    gave. (str.translate would be the obvious tool, but CPython only has a fast path for
+    ASCII input and is slower than the replace passes on CJK text.)
+
+    Moving a multi-character key in front of the single-character ones is only exact if no
+    earlier single-character entry reads, writes or deletes characters around it, or would
+    rewrite its value. If a mapping breaks that, the sequential passes are used instead.
+    """
+    items = list(special_chars.items())
+    multi_char = {han: viet for han, viet in items if len(han) > 1}
+    for index, (han, viet) in enumerate(items):
+        if len(han) > 1 and any(len(earlier) == 1 and (earlier in han or earlier in viet or not earlier_viet
+                                                       or any(c in han for c in earlier_viet))
+                                for earlier, earlier_viet in items[:index]):
+            logging.warning(f"Special character {han!r} depends on earlier replacements, using sequential replacement")
+            return lambda text: sequential_replace(text, items)
+    table: Dict[str, str] = {}
+    for index, (han, viet) in enumerate(items):
+        if len(han) != 1:
+            continue
+        for later_han, later_viet in items[index + 1:]:
+            viet = viet.replace(later_han, later_viet)
+        if viet != han:
+            table[han] = viet
+
+    if not table:
+        return lambda text: sequential_replace(text, multi_char.items())
+    pattern = re.compile('[' + ''.join(re.escape(han) for han in table) + ']')
+    lookup = table.__getitem__
+
+    def normalize(text: str) -> str:
+        for han, viet in multi_char.items():
+            if han in text:
+                text = text.replace(han, viet)
+        return pattern.sub(lambda m: lookup(m.group()), text)
+    return normalize
+
+replace_special_chars = build_special_char_normalizer(SPECIAL_CHARS)
+
 def convert_to_sino_vietnamese(text: str, names2: Trie, names: Trie, viet_phrase: Trie, chinese_phien_am: Dict[str, str]) -> str:
+    return convert_text(text, get_matcher(names2, names, viet_phrase), chinese_phien_am)
+
+def convert_text(text: str, matcher: MergedMatcher, chinese_phien_am: Dict[str, str]) -> str:
+    if profiler.enabled:
+        return convert_text_profiled(text, matcher, chinese_phien_am)
     text = replace_special_chars(text)
+    tokens = tokenize(text, matcher, chinese_phien_am)
+    result = rephrase(tokens)
+    return result
+
+def convert_text_profiled(text: str, matcher: MergedMatcher, chinese_phien_am: Dict[str, str]) -> str:
+    """convert_text with per-stage timings recorded in the profiler."""
+    start = time.perf_counter()
+    text = replace_special_chars(text)
+    replaced = time.perf_counter()
+    tokens = tokenize(text, matcher, chinese_phien_am)
+    matched = time.perf_counter()
+    result = rephrase(tokens)
+    profiler.add_stage_time("special_chars", replaced - start)
+    profiler.add_stage_time("matching", matched - replaced)
+    profiler.add_stage_time("rephrase", time.perf_counter() - matched)
+    return result
+
+def tokenize(text: str, matcher: MergedMatcher, chinese_phien_am: Dict[str, str]) -> List[str]:
+    tokens: List[str] = []
+    scan_tokens(text, 0, len(text), True, matcher, chinese_phien_am, tokens)
+    return tokens
+
+def iter_tokens(chunks: Iterable[str], matcher: MergedMatcher, chinese_phien_am: Dict[str, str]) -> Iterator[str]:
+    """
+    Tokenize text arriving as an iterator of (already special-char normalized) chunks.
+
+    Only the unconsumed tail of the previous chunk is kept, and a position is consumed
+    once the longest dictionary key fits in the buffered text after it, so the tokens
+    are identical to tokenize() on the joined text no matter where the chunks split.
+    """
+    lookahead = max(matcher.max_key_length, 1)
+    buffer = ""
+    position = 0
+    tokens: List[str] = []
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer = buffer[position:] + chunk
+        position = scan_tokens(buffer, 0, len(buffer) - lookahead, False, matcher, chinese_phien_am, tokens)
+        yield from tokens
+        tokens.clear()
+    scan_tokens(buffer, position, len(buffer), True, matcher, chinese_phien_am, tokens)
+    yield from tokens
+
+def scan_tokens(text: str, start: int, limit: int, final: bool, matcher: MergedMatcher,
+                chinese_phien_am: Dict[str, str], tokens: List[str]) -> int:
+    """
+    Append the tokens starting before `limit` to `tokens` and return the next position.
+
+    Matches may read past `limit` up to the end of `text`. Unless `final` is set, a Latin
+    run touching the end of `text` is left unconsumed because the next chunk may extend it.
+    """
+    text_length = len(text)
+    j = start
     
-    tokens = []
-    i = 0
-    chunk_size = 1000  # Process text in chunks of 1000 characters internally
-    
-    while i < len(text):
-        chunk = text[i:i+chunk_size]
-        j = 0
+    while j < limit:
+        # Check for a sequence of Latin characters
+        latin_start = j
+        while j < text_length and text[j] in LATIN_CHARS:
+            j += 1
+        if j > latin_start:
+            if j == text_length and not final:
+                return latin_start
+            latin_text = text[latin_start:j]
+            tokens.append(latin_text)
+            continue
         
-        while j < len(chunk):
-            # Check for a sequence of Latin characters
-            latin_start = j
-            while j < len(chunk) and chunk[j] in LATIN_CHARS:
-                j += 1
-            if j > latin_start:
-                latin_text = chunk[latin_start:j]
-                tokens.append(latin_text)
-                continue
-            
-            # Check Names2 first
-            name2_match, value = names2.find_longest_prefix(chunk[j:])
-            if name2_match:
+        # One walk over Names2, Names and VietPhrase at once
+        length, value, priority = matcher.match(text, j, text_length)
+        if length:
+            # Empty VietPhrase values drop the matched text, names are always emitted
+            if priority != PRIORITY_VIET_PHRASE or value != "":
                 tokens.append(value)
-                j += len(name2_match)
-                continue
-            
-            # Then check Names
-            name_match, value = names.find_longest_prefix(chunk[j:])
-            if name_match:
-                tokens.append(value)
-                j += len(name_match)
-                continue
-            
-            # Try to find the longest prefix in VietPhrase
-            max_prefix, value = viet_phrase.find_longest_prefix(chunk[j:])
-            if max_prefix:
-                if value != "":
-                    tokens.append(value)
-                j += len(max_prefix)
-            else:
-                # If no match found, fallback to ChinesePhienAmWord
-                char = chunk[j]
-                fallback_value = chinese_phien_am.get(char, char)
-                tokens.append(fallback_value)
-                j += 1
-        
-        i += chunk_size
+            j += length
+        else:
+            # If no match found, fallback to ChinesePhienAmWord
+            char = text[j]
+            fallback_value = chinese_phien_am.get(char, char)
+            tokens.append(fallback_value)
+            j += 1
     
-    result = rephrase(tokens)
-    return result
+    return j
 
-def rephrase(tokens):
+# The five spacing/capitalization rules of the original rephrase, applied in a single
+# regex pass. Every rule is keyed on the whitespace run between two non-space characters
+# (or on an opening quote directly followed by a word), and a run can satisfy at most one
+# of them, so applying them together gives the same text as applying them one after another:
+#   after [ “ ‘           drop the spaces and capitalize the word
+#   before ” ’ ]          drop the spaces
+#   after ? ! ⟨ : «       collapse the spaces to one and capitalize the word
+#   before ; : ? ! .      drop the spaces
+#   after a single .      collapse the spaces to one and capitalize the word
+# All branches start by consuming one character from a common set so the regex engine can
+# skip ahead with a character set search instead of trying every branch at every position.
+REPHRASE_PATTERN = re.compile(
+    r'[\s\[“‘?!⟨:«.](?:'
+    r'(?<=\s)\s*(?=[”’\];:?!.])'
+    r'|(?<=[\[“‘])\s*(?P<quote>\w)'
+    r'|(?<=[?!⟨:«])\s+(?P<mark>\w)'
+    r'|(?<=\.)\s+(?P<dot>\w))'
+)
+
+
+def _apply_rephrase_rule(match: re.Match) -> str:
+    word = match.group('quote')
+    if word is not None:
+        return match.group(0)[0] + word.upper()
+    word = match.group('mark')
+    if word is not None:
+        return match.group(0)[0] + ' ' + word.upper()
+    word = match.group('dot')
+    if word is None:
+        return ''
+    # Not after "..": the spaces in front of a dot are dropped, so look past them
+    text = match.string
+    i = match.start() - 1
+    while i >= 0 and text[i].isspace():
+        i -= 1
+    if i >= 0 and text[i] == '.':
+        return match.group(0)
+    return '. ' + word.upper()
+
+
+def join_tokens(tokens: List[str]) -> str:
+    """
+    Join converted tokens with spaces, capitalizing the first word.
+
+    :param tokens: Tokens produced by the tokenizer
+    :return: Joined text, stripped
+    """
     non_word = set('"[{ ,!?;\'.')
     result = []
     upper = False
@@ -229,20 +988,12 @@ def rephrase(tokens):
             result.append(token)
             last_token_empty = True
 
-    text = ''.join(result).strip()
-    # Remove spaces after left quotation marks and capitalize first word
-    text = re.sub(r'([\[\“\‘])\s*(\w)', lambda m: m.group(1) + m.group(2).upper(), text)
-    # Remove spaces before right quotation marks
-    text = re.sub(r'\s+([”\’\]])', r'\1', text)
-    # Capitalize first word after ? and ! marks
-    text = re.sub(r'([?!⟨:«])\s+(\w)', lambda m: m.group(1) + ' ' + m.group(2).upper(), text)
-    # Remove spaces before colon and semicolon
-    text = re.sub(r'\s+([;:?!.])', r'\1', text)
-    # Capitalize first word after a single dot, but not after triple dots
-    text = re.sub(r'(?<!\.)\.(?!\.)\s+(\w)', lambda m: '. ' + m.group(1).upper(), text)
-    return text
+    return ''.join(result).strip()
+
+
+def rephrase(tokens):
+    return REPHRASE_PATTERN.sub(_apply_rephrase_rule, join_tokens(tokens))
 
-@profile_function
 def process_paragraph(paragraph: str, names2: Trie, names: Trie, viet_phrase: Trie, chinese_phien_am: Dict[str, str]) -> str:
     converted = convert_to_sino_vietnamese(paragraph, names2, names, viet_phrase, chinese_phien_am)
     return converted
@@ -257,30 +1008,346 @@ def convert_filename(filename: str, names2: Trie, names: Trie, viet_phrase: Trie
     
     return f"{converted_name}_Converted{ext}"
 
+class ConversionCache:
+    """
+    Bounded LRU cache of converted paragraphs.
+
+    Entries are tied to the dictionaries they were converted with (the compiled matcher and
+    the ChinesePhienAm mapping). Asking with different dictionaries, e.g. after
+    reload_names2, drops every entry so stale translations are never served.
+    """
+    def __init__(self, max_entries: int = 50000, max_bytes: int = 128 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Tuple[str, int]]' = OrderedDict()
+        self._bytes = 0
+        self._dictionaries: Optional[Tuple[Any, Any]] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_dictionaries(self, matcher, chinese_phien_am) -> None:
+        current = self._dictionaries
+        if current is None or current[0] is not matcher or current[1] is not chinese_phien_am:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._dictionaries = (matcher, chinese_phien_am)
+
+    def get(self, text: str, matcher, chinese_phien_am: Dict[str, str]) -> Optional[str]:
+        with self._lock:
+            self._check_dictionaries(matcher, chinese_phien_am)
+            entry = self._entries.get(text)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(text)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, text: str, result: str, matcher, chinese_phien_am: Dict[str, str]) -> None:
+        size = sys.getsizeof(text) + sys.getsizeof(result)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_dictionaries(matcher, chinese_phien_am)
+            previous = self._entries.pop(text, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[text] = (result, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def record(self, hits: int, misses: int) -> None:
+        """Add lookups made elsewhere, e.g. by conversion worker processes."""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._dictionaries = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
 # Cache for storing frequently converted phrases
-conversion_cache = {}
+conversion_cache = ConversionCache()
 
-def cached_convert_to_sino_vietnamese(text: str, names2: Trie, names: Trie, viet_phrase: Trie, chinese_phien_am: Dict[str, str]) -> str:
-    if text in conversion_cache:
-        return conversion_cache[text]
-    
-    result = convert_to_sino_vietnamese(text, names2, names, viet_phrase, chinese_phien_am)
-    conversion_cache[text] = result
+def cached_convert_text(text: str, matcher: MergedMatcher, chinese_phien_am: Dict[str, str]) -> str:
+    result = conversion_cache.get(text, matcher, chinese_phien_am)
+    if result is None:
+        result = convert_text(text, matcher, chinese_phien_am)
+        conversion_cache.put(text, result, matcher, chinese_phien_am)
     return result
 
-@profile_function
-def process_novel(novel_text: str, names2: Trie, names: Trie, viet_phrase: Trie, chinese_phien_am: Dict[str, str], progress_callback=None) -> str:
-    paragraphs = novel_text.split('\n')
-    converted_paragraphs = []
+def cached_convert_to_sino_vietnamese(text: str, names2: Trie, names: Trie, viet_phrase: Trie, chinese_phien_am: Dict[str, str]) -> str:
+    return cached_convert_text(text, get_matcher(names2, names, viet_phrase), chinese_phien_am)
+
+_pool_lock = threading.Lock()
+_pool_state: Dict[str, Any] = {"executor": None, "matcher": None, "chinese_phien_am": None, "workers": 0}
+# Dictionaries seen by conversion worker processes
+_worker_state: Dict[str, Any] = {"matcher": None, "chinese_phien_am": None}
+
+def _init_conversion_worker(matcher: MergedMatcher, chinese_phien_am: Dict[str, str]) -> None:
+    _worker_state["matcher"] = matcher
+    _worker_state["chinese_phien_am"] = chinese_phien_am
+
+def _convert_batch(paragraphs: List[str]) -> Tuple[List[str], int, int]:
+    """Convert a batch in a worker and return it with the worker cache's hit/miss deltas."""
+    matcher = _worker_state["matcher"]
+    chinese_phien_am = _worker_state["chinese_phien_am"]
+    hits, misses = conversion_cache.hits, conversion_cache.misses
+    converted = [cached_convert_text(paragraph, matcher, chinese_phien_am) for paragraph in paragraphs]
+    return converted, conversion_cache.hits - hits, conversion_cache.misses - misses
+
+def _convert_file_task(input_path: str, output_path: str, fallback_output_path: Optional[str] = None) -> Tuple[Optional[str], float]:
+    """Convert a whole file in a worker; returns the written path and the time spent."""
+    start_time = time.perf_counter()
+    written_path = convert_file_with_matcher(input_path, output_path, _worker_state["matcher"], _worker_state["chinese_phien_am"],
+                                             fallback_output_path=fallback_output_path)
+    return written_path, time.perf_counter() - start_time
+
+def get_conversion_pool(matcher: MergedMatcher, chinese_phien_am: Dict[str, str], workers: int) -> ProcessPoolExecutor:
+    """
+    Return a process pool whose workers already hold these dictionaries.
+
+    With the fork start method the workers inherit the dictionaries from this process, so
+    nothing is pickled. Elsewhere (Windows) they are pickled once per worker through the
+    pool initializer, never per task. The pool is kept until the dictionaries change.
+    """
+    with _pool_lock:
+        state = _pool_state
+        if (state["executor"] is not None and state["matcher"] is matcher
+                and state["chinese_phien_am"] is chinese_phien_am and state["workers"] == workers):
+            return state["executor"]
+        if state["executor"] is not None:
+            state["executor"].shutdown(wait=False, cancel_futures=True)
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _init_conversion_worker(matcher, chinese_phien_am)
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_conversion_worker,
+                                           initargs=(matcher, chinese_phien_am))
+        state.update(executor=executor, matcher=matcher, chinese_phien_am=chinese_phien_am, workers=workers)
+        return executor
+
+def shutdown_conversion_pool() -> None:
+    with _pool_lock:
+        if _pool_state["executor"] is not None:
+            _pool_state["executor"].shutdown(wait=False, cancel_futures=True)
+        _pool_state.update(executor=None, matcher=None, chinese_phien_am=None, workers=0)
+
+def iter_converted_batches(batches: Iterable[Tuple[List[str], Any]], matcher: MergedMatcher,
+                           chinese_phien_am: Dict[str, str], workers: int) -> Iterator[Tuple[List[str], Any]]:
+    """
+    Convert batches of paragraphs on a process pool and yield them in their original order.
+
+    Batches are pulled lazily and at most a couple per worker are in flight, so they can come
+    straight from a file. Closing the generator early cancels the batches still queued.
+
+    :param batches: (paragraphs, tag) pairs; the tag is passed through untouched
+    :return: Iterator of (converted paragraphs, tag)
+    """
+    executor = get_conversion_pool(matcher, chinese_phien_am, workers)
+    pending = deque()
+    # Keep a couple of batches per worker in flight so the pool never idles
+    max_in_flight = workers * 2
+
+    def collect_next() -> Tuple[List[str], Any]:
+        future, tag = pending.popleft()
+        converted, hits, misses = future.result()
+        conversion_cache.record(hits, misses)
+        return converted, tag
+
+    try:
+        for batch, tag in batches:
+            pending.append((executor.submit(_convert_batch, batch), tag))
+            if len(pending) >= max_in_flight:
+                yield collect_next()
+        while pending:
+            yield collect_next()
+    finally:
+        for future, _ in pending:
+            future.cancel()
+
+def convert_paragraphs_parallel(paragraphs: List[str], matcher: MergedMatcher, chinese_phien_am: Dict[str, str],
+                                workers: int, batch_size: int = 200, progress_callback=None) -> List[str]:
+    """
+    Convert paragraphs in batches on a process pool and return them in their original order.
+
+    progress_callback is called after each batch in order; returning True stops the
+    conversion, cancels the queued batches and returns what was converted so far.
+    """
     total_paragraphs = len(paragraphs)
+    batches = ((paragraphs[start:start + batch_size], start) for start in range(0, total_paragraphs, batch_size))
+    converted_paragraphs: List[str] = []
+    converted_batches = iter_converted_batches(batches, matcher, chinese_phien_am, workers)
+    try:
+        for converted, _ in converted_batches:
+            converted_paragraphs.extend(converted)
+            if progress_callback and progress_callback(len(converted_paragraphs) / total_paragraphs):
+                break
+    finally:
+        converted_batches.close()
+    return converted_paragraphs
 
-    for i, paragraph in enumerate(paragraphs):
-        converted = cached_convert_to_sino_vietnamese(paragraph, names2, names, viet_phrase, chinese_phien_am)
-        converted_paragraphs.append(converted)
-        
-        if progress_callback:
-            progress = (i + 1) / total_paragraphs
-            if progress_callback(progress):
-                break  # Stop processing if the callback returns True
+@profiled
+def process_novel(novel_text: str, names2: Trie, names: Trie, viet_phrase: Trie, chinese_phien_am: Dict[str, str], progress_callback=None,
+                  workers: int = 1) -> str:
+    paragraphs = novel_text.split('\n')
 
+    matcher = get_matcher(names2, names, viet_phrase)
+    if workers > 1:
+        converted_paragraphs = convert_paragraphs_parallel(paragraphs, matcher, chinese_phien_am, workers,
+                                                           progress_callback=progress_callback)
+    else:
+        converted_paragraphs = []
+        total_paragraphs = len(paragraphs)
+
+        for i, paragraph in enumerate(paragraphs):
+            converted = cached_convert_text(paragraph, matcher, chinese_phien_am)
+            converted_paragraphs.append(converted)
+            
+            if progress_callback:
+                progress = (i + 1) / total_paragraphs
+                if progress_callback(progress):
+                    break  # Stop processing if the callback returns True
+
+    logging.info(f"Conversion cache: {conversion_cache.stats()}")
     return '\n'.join(converted_paragraphs)
+
+def iter_paragraph_blocks(reader: io.TextIOBase, block_size: int = 1 << 18) -> Iterator[List[str]]:
+    """
+    Read text block by block and yield its paragraphs.
+
+    The paragraphs are those of text.split('\\n'), so text ending with a newline yields a
+    final empty one.
+
+    :param reader: Text stream to read
+    :param block_size: Number of characters read at a time
+    :return: Iterator of paragraph lists
+    """
+    leftover = ''
+    while True:
+        block = reader.read(block_size)
+        if not block:
+            break
+        paragraphs = (leftover + block).split('\n')
+        leftover = paragraphs.pop()
+        if paragraphs:
+            yield paragraphs
+    yield [leftover]
+
+def iter_file_paragraphs(file_path: str, encoding: str, block_size: int = 1 << 18) -> Iterator[Tuple[List[str], int]]:
+    """
+    Read a novel file block by block and yield its paragraphs.
+
+    Newlines are translated the same way as open(file_path, 'r') does.
+
+    :param file_path: Path to the novel
+    :param encoding: Codec to decode it with
+    :param block_size: Number of characters decoded per read
+    :return: Iterator of (paragraphs, bytes consumed so far)
+    """
+    with open(file_path, 'rb') as binary:
+        for paragraphs in iter_paragraph_blocks(io.TextIOWrapper(binary, encoding=encoding), block_size):
+            yield paragraphs, binary.tell()
+
+@profiled
+def convert_file(input_path: str, output_path: str, names2: Trie, names: Trie, viet_phrase: Trie,
+                 chinese_phien_am: Dict[str, str], encoding: Optional[str] = None, progress_callback=None, workers: int = 1,
+                 batch_size: int = 200, fallback_output_path: Optional[str] = None, store=None) -> Optional[str]:
+    """
+    Convert a novel file to a UTF-8 output file without holding either in memory.
+
+    Paragraphs are read, converted and written through buffered streams in batches, so memory
+    stays flat regardless of the file size. The output goes to a temporary file next to
+    output_path and is moved into place once the conversion completes.
+
+    :param input_path: Path to the novel
+    :param output_path: Path of the converted file
+    :param encoding: Codec of the novel; detected from a sample when not given
+    :param progress_callback: Called with the fraction of input bytes consumed after each batch;
+                              returning True stops the conversion and discards the output
+    :param workers: Number of worker processes; 1 converts in this process
+    :param batch_size: Number of paragraphs per batch
+    :param fallback_output_path: Used if output_path cannot be created, e.g. a name too long for the file system
+    :param store: Optional conversion_store.ConversionStore; paragraphs it still holds are not reconverted
+    :return: Path of the written file, or None if the conversion was stopped
+    """
+    matcher = get_matcher(names2, names, viet_phrase)
+    return convert_file_with_matcher(input_path, output_path, matcher, chinese_phien_am, encoding, progress_callback,
+                                     workers, batch_size, fallback_output_path, store)
+
+def convert_file_with_matcher(input_path: str, output_path: str, matcher: MergedMatcher, chinese_phien_am: Dict[str, str],
+                              encoding: Optional[str] = None, progress_callback=None, workers: int = 1, batch_size: int = 200,
+                              fallback_output_path: Optional[str] = None, store=None) -> Optional[str]:
+    """Body of convert_file for an already compiled matcher, e.g. inside a worker process."""
+    encoding = encoding or novel_io.detect_stream_encoding(input_path)
+    total_bytes = os.path.getsize(input_path) or 1
+    batches = ((block[start:start + batch_size], position)
+               for block, position in iter_file_paragraphs(input_path, encoding)
+               for start in range(0, len(block), batch_size))
+    if store is not None:
+        batches = store.split_batches(batches)
+    if workers > 1:
+        converted_batches = iter_converted_batches(batches, matcher, chinese_phien_am, workers)
+    else:
+        converted_batches = (([cached_convert_text(paragraph, matcher, chinese_phien_am) for paragraph in batch], position)
+                             for batch, position in batches)
+
+    temp_path = os.path.join(os.path.dirname(output_path), f".qtbatch_{os.getpid()}_{threading.get_ident()}.tmp")
+    completed = False
+    try:
+        with open(temp_path, 'w', encoding='utf-8', buffering=1 << 20) as writer:
+            first = True
+            for converted, position in converted_batches:
+                if store is not None:
+                    converted, position = store.merge(converted, position)
+                if not first:
+                    writer.write('\n')
+                writer.write('\n'.join(converted))
+                first = False
+                if progress_callback and progress_callback(min(position / total_bytes, 1.0)):
+                    break
+            else:
+                completed = True
+    finally:
+        converted_batches.close()
+        if store is not None:
+            store.finish(completed)
+        if not completed and os.path.exists(temp_path):
+            os.remove(temp_path)
+    logging.info(f"Conversion cache: {conversion_cache.stats()}")
+    if not completed:
+        return None
+
+    try:
+        os.replace(temp_path, output_path)
+    except OSError as e:
+        if not fallback_output_path:
+            os.remove(temp_path)
+            raise
+        os.replace(temp_path, fallback_output_path)
+        logging.warning(f"Used shortened filename due to error: {e}")
+        output_path = fallback_output_path
+    return output_path
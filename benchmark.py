@@ -0,0 +1,452 @@
+"""
+Micro-benchmarks for the conversion pipeline.
+
+Everything runs on synthetic dictionaries and a synthetic novel so the numbers are
+reproducible without the real VietPhrase/Names data files.
+
+Usage:
+    python benchmark.py matcher [--chars 2000000]
+    python benchmark.py backend [--chars 2000000]
+    python benchmark.py workers [--chars 4000000] [--workers 1 2 4 8]
+    python benchmark.py normalize [--chars 4000000] [--lengths 30 100 300 1000]
+    python benchmark.py rephrase [--chars 2000000]
+    python benchmark.py hanlp [--novel novel.txt] [--sentences 2000] [--batch-sizes 1 8 32 64]
+    python benchmark.py mine [--novel novel.txt] [--chars 4000000]
+    python benchmark.py stream [--chars 500000] [--chunkings 20]
+"""
+import re
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import config
+import QuickTranslator as qt
+import novel_io
+from name_miner import NameMiner
+from ReplaceChar import SPECIAL_CHARS
+
+CJK_START = 0x4E00
+CJK_RANGE = 3500
+PUNCTUATION = ['，', '。', '！', '？', '“', '”', '：']
+
+# Expected rephrase output, produced by the original five-pass implementation
+REPHRASE_GOLDEN = [
+    (['xin', 'chào', '.', 'hôm', 'nay', 'trời', 'đẹp', '.'],
+     'Xin chào. Hôm nay trời đẹp.'),
+    (['hắn', 'nói', ':', '“', 'ngươi', 'là', 'ai', '?', '”'],
+     'Hắn nói: “Ngươi là ai?”'),
+    (['‘', 'được', '’', ',', 'nàng', 'đáp', '!', 'rồi', 'đi'],
+     '‘Được’, nàng đáp! Rồi đi'),
+    (['chờ', '...', 'đã', '.', '.', 'sau', 'đó'],
+     'Chờ... đã.. sau đó'),
+    (['[', 'hệ', 'thống', ']', ';', 'nhắc', 'nhở', '?', '!', 'ok'],
+     '[Hệ thống]; nhắc nhở?! Ok'),
+    (['«', 'tên', '»', '⟨', 'chú', 'thích', '⟩', 'hết'],
+     '« Tên » ⟨ Chú thích ⟩ hết'),
+    (['QT123', 'abc', '   ', 'def', '.', 'ghi'],
+     'QT123 abc    def. Ghi'),
+    (['a', '“', ' ', 'ß', '”', '.', '\u3000', 'ŉ'],
+     'A “SS”. ʼN'),
+]
+
+
+def random_word(rng: random.Random, min_len: int, max_len: int) -> str:
+    return ''.join(chr(CJK_START + rng.randrange(CJK_RANGE)) for _ in range(rng.randint(min_len, max_len)))
+
+
+def build_synthetic_dictionaries(seed: int = 42, viet_phrase_size: int = 200000, names_size: int = 20000,
+                                 names2_size: int = 5000) -> Tuple[qt.Trie, qt.Trie, qt.Trie, Dict[str, str]]:
+    """
+    Build Names2, Names and VietPhrase tries plus a ChinesePhienAm mapping of realistic sizes.
+
+    :param seed: Random seed
+    :return: (names2, names, viet_phrase, chinese_phien_am)
+    """
+    rng = random.Random(seed)
+    names2 = qt.Trie()
+    names = qt.Trie()
+    viet_phrase = qt.Trie()
+    names2.batch_insert([(random_word(rng, 2, 3), f"Name{i}") for i in range(names2_size)])
+    names.batch_insert([(random_word(rng, 2, 4), f"name{i}") for i in range(names_size)])
+    viet_phrase.batch_insert([(random_word(rng, 1, 6), f"phrase{i}") for i in range(viet_phrase_size)])
+    chinese_phien_am = {chr(CJK_START + i): f"am{i}" for i in range(CJK_RANGE)}
+    return names2, names, viet_phrase, chinese_phien_am
+
+
+def build_synthetic_novel(total_chars: int, dictionaries: Tuple[qt.Trie, qt.Trie, qt.Trie, Dict[str, str]],
+                          seed: int = 7) -> str:
+    """
+    Build a novel mixing dictionary words, unknown characters, punctuation and Latin runs.
+
+    :param total_chars: Approximate length of the generated text
+    :return: Novel text with paragraphs separated by newlines
+    """
+    rng = random.Random(seed)
+    names2, names, viet_phrase, _ = dictionaries
+    vocabulary = [word for trie in (names2, names, viet_phrase) for word, _ in trie.items()]
+    rng.shuffle(vocabulary)
+    vocabulary = vocabulary[:50000]
+    parts: List[str] = []
+    length = 0
+    paragraph_length = 0
+    while length < total_chars:
+        roll = rng.random()
+        if roll < 0.75:
+            piece = rng.choice(vocabulary)
+        elif roll < 0.9:
+            piece = random_word(rng, 1, 2)
+        elif roll < 0.98:
+            piece = rng.choice(PUNCTUATION)
+        else:
+            piece = 'QT' + str(rng.randrange(1000))
+        parts.append(piece)
+        length += len(piece)
+        paragraph_length += len(piece)
+        if paragraph_length > 300 and piece == '。':
+            parts.append('\n')
+            paragraph_length = 0
+    return ''.join(parts)
+
+
+def legacy_tokenize(text: str, names2: qt.Trie, names: qt.Trie, viet_phrase: qt.Trie,
+                    chinese_phien_am: Dict[str, str]) -> List[str]:
+    """Reference copy of the original three-lookup tokenizer loop."""
+    tokens = []
+    i = 0
+    chunk_size = 1000
+    while i < len(text):
+        chunk = text[i:i + chunk_size]
+        j = 0
+        while j < len(chunk):
+            latin_start = j
+            while j < len(chunk) and chunk[j] in qt.LATIN_CHARS:
+                j += 1
+            if j > latin_start:
+                tokens.append(chunk[latin_start:j])
+                continue
+            name2_match, value = names2.find_longest_prefix(chunk[j:])
+            if name2_match:
+                tokens.append(value)
+                j += len(name2_match)
+                continue
+            name_match, value = names.find_longest_prefix(chunk[j:])
+            if name_match:
+                tokens.append(value)
+                j += len(name_match)
+                continue
+            max_prefix, value = viet_phrase.find_longest_prefix(chunk[j:])
+            if max_prefix:
+                if value != "":
+                    tokens.append(value)
+                j += len(max_prefix)
+            else:
+                char = chunk[j]
+                tokens.append(chinese_phien_am.get(char, char))
+                j += 1
+        i += chunk_size
+    return tokens
+
+
+def legacy_rephrase(tokens: List[str]) -> str:
+    """Reference copy of the original rephrase: join, then five regex passes."""
+    text = qt.join_tokens(tokens)
+    text = re.sub(r'([\[\“\‘])\s*(\w)', lambda m: m.group(1) + m.group(2).upper(), text)
+    text = re.sub(r'\s+([”\’\]])', r'\1', text)
+    text = re.sub(r'([?!⟨:«])\s+(\w)', lambda m: m.group(1) + ' ' + m.group(2).upper(), text)
+    text = re.sub(r'\s+([;:?!.])', r'\1', text)
+    text = re.sub(r'(?<!\.)\.(?!\.)\s+(\w)', lambda m: '. ' + m.group(1).upper(), text)
+    return text
+
+
+def time_call(func: Callable, *args, repeat: int = 3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report(label: str, seconds: float, chars: int) -> None:
+    print(f"{label:<32} {seconds:8.3f}s  {chars / seconds / 1e6:8.2f} M chars/s")
+
+
+def bench_matcher(args) -> None:
+    dictionaries = build_synthetic_dictionaries()
+    names2, names, viet_phrase, chinese_phien_am = dictionaries
+    novel = qt.replace_special_chars(build_synthetic_novel(args.chars, dictionaries))
+    print(f"Novel: {len(novel)} chars")
+
+    start = time.perf_counter()
+    matcher = qt.MergedMatcher.from_tries(names2, names, viet_phrase)
+    print(f"Merged matcher compiled in {time.perf_counter() - start:.2f}s ({matcher.count()} entries)")
+
+    legacy_time, legacy_tokens = time_call(legacy_tokenize, novel, names2, names, viet_phrase, chinese_phien_am)
+    merged_time, merged_tokens = time_call(qt.tokenize, novel, matcher, chinese_phien_am)
+    report("three lookups (before)", legacy_time, len(novel))
+    report("merged matcher (after)", merged_time, len(novel))
+    # The legacy loop also splits phrases at its 1000-char chunk seams, so token counts may differ slightly
+    print(f"Speedup: {legacy_time / merged_time:.2f}x, tokens: {len(legacy_tokens)} before, {len(merged_tokens)} after")
+
+
+def measure_build(build: Callable):
+    """Time a build, then repeat it under tracemalloc (which slows it down) to measure retained memory."""
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current
+
+
+def scan_positions(trie, text: str) -> int:
+    matched = 0
+    end = len(text)
+    for i in range(end):
+        length, _ = trie.find_longest_prefix_at(text, i, end)
+        matched += length
+    return matched
+
+
+def bench_backend(args) -> None:
+    rng = random.Random(42)
+    entries = [(random_word(rng, 1, 6), f"phrase{i}") for i in range(args.entries)]
+    novel = ''.join(random_word(rng, 1, 1) if rng.random() < 0.2 else rng.choice(entries)[0]
+                    for _ in range(args.chars // 3))[:args.chars]
+    print(f"VietPhrase: {len(entries)} entries, text: {len(novel)} chars")
+
+    def build_trie():
+        trie = qt.Trie()
+        trie.batch_insert(entries)
+        return trie
+
+    trie, trie_build, trie_memory = measure_build(build_trie)
+    array_trie, array_build, array_memory = measure_build(lambda: qt.ArrayTrie.from_entries(entries))
+    print(f"{'backend':<12} {'build':>8} {'memory':>10} {'lookup':>14}")
+    for label, backend, build_time, memory in (("TrieNode", trie, trie_build, trie_memory),
+                                               ("ArrayTrie", array_trie, array_build, array_memory)):
+        lookup_time, _ = time_call(scan_positions, backend, novel)
+        print(f"{label:<12} {build_time:7.2f}s {memory / 2**20:8.1f}MB {len(novel) / lookup_time / 1e6:8.2f} M pos/s")
+
+
+def bench_workers(args) -> None:
+    dictionaries = build_synthetic_dictionaries()
+    names2, names, viet_phrase, chinese_phien_am = dictionaries
+    novel = build_synthetic_novel(args.chars, dictionaries)
+    print(f"Novel: {len(novel)} chars, {novel.count(chr(10)) + 1} paragraphs")
+    qt.get_matcher(names2, names, viet_phrase)
+
+    baseline = None
+    for workers in args.workers:
+        if workers > 1:
+            # Start the pool outside the timed run; it is reused across novels
+            qt.get_conversion_pool(qt.get_matcher(names2, names, viet_phrase), chinese_phien_am, workers)
+        qt.conversion_cache.clear()
+        start = time.perf_counter()
+        qt.process_novel(novel, names2, names, viet_phrase, chinese_phien_am, workers=workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        report(f"{workers} worker(s)", elapsed, len(novel))
+        print(f"{'':<32} speedup {baseline / elapsed:.2f}x")
+    qt.shutdown_conversion_pool()
+
+
+def bench_normalize(args) -> None:
+    dictionaries = build_synthetic_dictionaries(viet_phrase_size=20000)
+    text = build_synthetic_novel(args.chars, dictionaries).replace('\n', '')
+    megabytes = len(text.encode('utf-8')) / 2**20
+    print(f"{megabytes:.1f} MB of text, {sum(text.count(p) for p in PUNCTUATION) / len(text):.1%} punctuation")
+
+    def run(normalize: Callable[[str], str], paragraphs: List[str]) -> List[str]:
+        return [normalize(paragraph) for paragraph in paragraphs]
+
+    # The sequential passes cost a fixed ~120 calls per paragraph, so the gap depends on paragraph length
+    for paragraph_length in args.lengths:
+        paragraphs = [text[i:i + paragraph_length] for i in range(0, len(text), paragraph_length)]
+        sequential_time, sequential = time_call(run, lambda t: qt.sequential_replace(t, SPECIAL_CHARS.items()), paragraphs)
+        single_pass_time, single_pass = time_call(run, qt.replace_special_chars, paragraphs)
+        print(f"paragraphs of {paragraph_length:>5} chars: sequential {sequential_time / megabytes * 1000:7.2f} ms/MB, "
+              f"single pass {single_pass_time / megabytes * 1000:7.2f} ms/MB, "
+              f"speedup {sequential_time / single_pass_time:5.2f}x, identical: {sequential == single_pass}")
+
+
+def bench_rephrase(args) -> None:
+    failures = 0
+    for tokens, expected in REPHRASE_GOLDEN:
+        for label, implementation in (("five passes", legacy_rephrase), ("single pass", qt.rephrase)):
+            output = implementation(tokens)
+            if output != expected:
+                failures += 1
+                print(f"GOLDEN MISMATCH ({label}): {tokens!r} -> {output!r}, expected {expected!r}")
+    print(f"Golden corpus: {len(REPHRASE_GOLDEN)} cases, {failures} mismatches")
+
+    dictionaries = build_synthetic_dictionaries(viet_phrase_size=50000)
+    names2, names, viet_phrase, chinese_phien_am = dictionaries
+    novel = qt.replace_special_chars(build_synthetic_novel(args.chars, dictionaries))
+    matcher = qt.MergedMatcher.from_tries(names2, names, viet_phrase)
+    paragraphs = [qt.tokenize(paragraph, matcher, chinese_phien_am) for paragraph in novel.split('\n')]
+    print(f"Novel: {len(novel)} chars, {len(paragraphs)} paragraphs, {sum(map(len, paragraphs))} tokens")
+
+    def run(implementation: Callable[[List[str]], str]) -> List[str]:
+        return [implementation(tokens) for tokens in paragraphs]
+
+    legacy_time, legacy_output = time_call(run, legacy_rephrase)
+    fused_time, fused_output = time_call(run, qt.rephrase)
+    join_time, _ = time_call(run, qt.join_tokens)
+    report("five passes (before)", legacy_time, len(novel))
+    report("single pass (after)", fused_time, len(novel))
+    report("join only", join_time, len(novel))
+    print(f"Speedup: {legacy_time / fused_time:.2f}x, identical: {legacy_output == fused_output}")
+
+
+def bench_hanlp(args) -> None:
+    # Imported here so the other benchmarks run without HanLP installed
+    from name_analyzer import HanLPAnalyzer
+
+    if args.novel:
+        analyzer = HanLPAnalyzer(args.novel, config.CHINESE_PHIEN_AM_PATH)
+        analyzer.read_novel()
+        text = analyzer.novel_text
+    else:
+        analyzer = HanLPAnalyzer("benchmark.txt", config.CHINESE_PHIEN_AM_PATH)
+        text = build_synthetic_novel(args.sentences * 40, build_synthetic_dictionaries(viet_phrase_size=50000))
+    segments = [segment for paragraph in text.split('\n') for segment in analyzer.iter_segments(paragraph)]
+    segments = segments[:args.sentences]
+    start = time.perf_counter()
+    analyzer.load_models()
+    print(f"Models loaded in {time.perf_counter() - start:.2f}s; {len(segments)} segments, "
+          f"{sum(map(len, segments))} chars")
+
+    # Warm-up, so the first timed batch size does not pay for lazy initialization
+    analyzer.batch_size = max(args.batch_sizes)
+    analyzer.recognize_segments(segments[:analyzer.batch_size])
+
+    baseline = None
+    for batch_size in args.batch_sizes:
+        analyzer.batch_size = batch_size
+        start = time.perf_counter()
+        results = analyzer.recognize_segments(segments)
+        seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        recognized = sum(entities is not None for entities in results)
+        print(f"batch size {batch_size:4d}: {len(segments) / seconds:8.1f} sentences/s "
+              f"({baseline / seconds:.2f}x vs. batch size {args.batch_sizes[0]}), {recognized} recognized")
+
+
+def bench_mine(args) -> None:
+    if args.novel:
+        text, _ = novel_io.read_novel_text(args.novel)
+    else:
+        text = build_synthetic_novel(args.chars, build_synthetic_dictionaries(viet_phrase_size=50000))
+    start = time.perf_counter()
+    miner = NameMiner()
+    for paragraph in text.split('\n'):
+        miner.feed(paragraph)
+    miner.finish()
+    count_time = time.perf_counter() - start
+    start = time.perf_counter()
+    candidates = miner.candidates()
+    score_time = time.perf_counter() - start
+    tracked = sum(len(counts) for counts in miner.counts)
+    report("count n-grams", count_time, len(text))
+    report("score candidates", score_time, len(text))
+    print(f"{len(candidates)} candidates, {tracked} tracked n-grams")
+    for name, info in sorted(candidates.items(), key=lambda item: -item[1]['appearances'])[:10]:
+        print(f"  {name} {info['category']} {info['appearances']}")
+
+
+def random_chunks(rng: random.Random, text: str, max_chunk: int) -> List[str]:
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + rng.randint(1, max_chunk)
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def bench_stream(args) -> None:
+    dictionaries = build_synthetic_dictionaries(viet_phrase_size=50000)
+    names2, names, viet_phrase, chinese_phien_am = dictionaries
+    text = build_synthetic_novel(args.chars, dictionaries)
+    matcher = qt.MergedMatcher.from_tries(names2, names, viet_phrase)
+    normalized = qt.replace_special_chars(text)
+    expected = qt.convert_text(text, matcher, chinese_phien_am)
+    print(f"Novel: {len(text)} chars, longest key {matcher.max_key_length} chars")
+
+    # Chunk sizes from a single character up to a few blocks, so seams fall inside keys and Latin runs
+    rng = random.Random(args.seed)
+    mismatches = 0
+    for trial in range(args.chunkings):
+        max_chunk = rng.choice([1, 2, matcher.max_key_length, 64, 4096, 65536])
+        chunks = random_chunks(rng, normalized, max_chunk)
+        output = qt.rephrase(list(qt.iter_tokens(chunks, matcher, chinese_phien_am)))
+        if output != expected:
+            mismatches += 1
+            position = next((i for i, (a, b) in enumerate(zip(output, expected)) if a != b), min(len(output), len(expected)))
+            print(f"MISMATCH with chunks of up to {max_chunk} chars at output position {position}: "
+                  f"{output[position:position + 40]!r} vs. {expected[position:position + 40]!r}")
+    print(f"{args.chunkings} random chunkings, {mismatches} mismatches against convert_text")
+
+    chunks = random_chunks(rng, normalized, 65536)
+    stream_time, _ = time_call(lambda: list(qt.iter_tokens(chunks, matcher, chinese_phien_am)))
+    tokenize_time, _ = time_call(qt.tokenize, normalized, matcher, chinese_phien_am)
+    report("tokenize", tokenize_time, len(normalized))
+    report("iter_tokens (64K chunks)", stream_time, len(normalized))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="QTBatch conversion benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    matcher_parser = subparsers.add_parser("matcher", help="Three Trie lookups vs. the merged matcher")
+    matcher_parser.add_argument("--chars", type=int, default=2000000)
+    matcher_parser.set_defaults(func=bench_matcher)
+
+    backend_parser = subparsers.add_parser("backend", help="TrieNode vs. ArrayTrie memory and lookup speed")
+    backend_parser.add_argument("--entries", type=int, default=300000)
+    backend_parser.add_argument("--chars", type=int, default=1000000)
+    backend_parser.set_defaults(func=bench_backend)
+
+    workers_parser = subparsers.add_parser("workers", help="process_novel scaling over worker processes")
+    workers_parser.add_argument("--chars", type=int, default=4000000)
+    workers_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    workers_parser.set_defaults(func=bench_workers)
+
+    normalize_parser = subparsers.add_parser("normalize", help="Special character normalization cost per MB")
+    normalize_parser.add_argument("--chars", type=int, default=4000000)
+    normalize_parser.add_argument("--lengths", type=int, nargs="+", default=[30, 100, 300, 1000])
+    normalize_parser.set_defaults(func=bench_normalize)
+
+    rephrase_parser = subparsers.add_parser("rephrase", help="Rephrase stage in isolation, with a golden-output check")
+    rephrase_parser.add_argument("--chars", type=int, default=2000000)
+    rephrase_parser.set_defaults(func=bench_rephrase)
+
+    hanlp_parser = subparsers.add_parser("hanlp", help="Name analysis NER throughput at different batch sizes")
+    hanlp_parser.add_argument("--novel", help="Novel to take sentences from (default: synthetic text)")
+    hanlp_parser.add_argument("--sentences", type=int, default=2000)
+    hanlp_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    hanlp_parser.set_defaults(func=bench_hanlp)
+
+    mine_parser = subparsers.add_parser("mine", help="Statistical name mining over a whole novel")
+    mine_parser.add_argument("--novel", help="Novel to mine (default: synthetic text)")
+    mine_parser.add_argument("--chars", type=int, default=4000000)
+    mine_parser.set_defaults(func=bench_mine)
+
+    stream_parser = subparsers.add_parser("stream", help="Streaming tokenizer against convert_text over random chunkings")
+    stream_parser.add_argument("--chars", type=int, default=500000)
+    stream_parser.add_argument("--chunkings", type=int, default=20)
+    stream_parser.add_argument("--seed", type=int, default=1)
+    stream_parser.set_defaults(func=bench_stream)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,42 @@ NAMES_PATH = "Names.txt"
 CHINESE_PHIEN_AM_PATH = "ChinesePhienAmWords.txt"
 VIET_PHRASE_PATH = "VietPhrase.txt"
 
+# Dictionary backend: "array" (compact immutable ArrayTrie, Names2 matched as a small layer on
+# top, so reloading Names2 only rebuilds that layer) or "trie" (TrieNode chains)
+DICTIONARY_BACKEND = "array"
+# Reuse compiled dictionaries from caches/dictionaries while the .txt files are unchanged.
+# Only the "array" backend uses the cache; together they make a restart near-instant
+DICTIONARY_CACHE = True
+# Load the dictionary files concurrently, sharding the parsing of large files across processes.
+# Building the tries holds the GIL and dominates loading, so this only pays off on several cores
+# with no dictionary cache; with the array backend's cache there is nothing left to parallelize
+DICTIONARY_PARALLEL_LOADING = False
+
+# Worker processes used to convert a novel (1 converts on the calling thread)
+CONVERSION_WORKERS = max(1, min(8, (os.cpu_count() or 1) - 1))
+# Keep converted paragraphs per novel under caches/conversions, so a rerun after editing
+# Names2 only reconverts the paragraphs containing the edited names
+INCREMENTAL_CONVERSION = True
+
+# Reload Names2.txt automatically when it changes on disk, checking every few seconds
+WATCH_NAMES2 = True
+WATCH_NAMES2_INTERVAL = 2.0
+
+# Sentence segments fed through the HanLP tokenizer and NER per call during name analysis
+HANLP_BATCH_SIZE = 32
+# Worker processes for name analysis; each loads its own copy of the HanLP models, so memory
+# grows with every worker (1 analyzes on a background thread of the GUI process)
+HANLP_WORKERS = 1
+# Name analysis checkpoints its cache after this many paragraphs or seconds, whichever comes first
+HANLP_CHECKPOINT_PARAGRAPHS = 200
+HANLP_CHECKPOINT_SECONDS = 30.0
+# Skip NER on sentences whose names are all in the dictionaries already (useful when re-analyzing
+# a novel whose names are curated; appearances of known names are then not counted)
+HANLP_PREFILTER = False
+# Exported HanLP analysis results, and the candidates of Quick Mine Names kept apart from them
+ANALYZED_NAMES_PATH = "AnalyzedNames.csv"
+MINED_NAMES_PATH = "MinedNames.csv"
+
 # GUI configuration
 WINDOW_WIDTH = 710
 WINDOW_HEIGHT = 925
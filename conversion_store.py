@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import QuickTranslator as qt
+
+STORE_DIR = os.path.join('caches', 'conversions')
+# Bump when a change to the conversion pipeline alters its output
+STORE_VERSION = 1
+# Beyond this many changed Names2 keys, checking every paragraph for them costs more than it saves
+MAX_CHANGED_KEYS = 5000
+# Rows are written in transactions of roughly this many paragraphs
+COMMIT_INTERVAL = 5000
+SQLITE_MAX_VARIABLES = 500
+
+
+def dictionary_signature(loading_info: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Fingerprint the dictionaries that are only ever reloaded from disk as a whole.
+
+    Names2 is not part of it: it changes in place through reload_names2 and is compared
+    entry by entry instead.
+
+    :param loading_info: loading_info returned by load_data
+    :return: Hex digest of the Names, VietPhrase and ChinesePhienAm source files
+    """
+    sources = [loading_info.get(key, {}).get("source") for key in ("names", "viet_phrase", "chinese_words")]
+    return hashlib.sha1(json.dumps([STORE_VERSION, sources], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def paragraph_hash(paragraph: str) -> bytes:
+    return hashlib.blake2b(paragraph.encode('utf-8'), digest_size=16).digest()
+
+
+class ConversionStore:
+    """
+    Persistent per-novel store of converted paragraphs, for reconverting after Names2 edits.
+
+    Every row is stamped with the dictionary state it was converted under. The store also
+    keeps a snapshot of the Names2 entries and the state of its last completed run. On the
+    next run, a row from that state is reused unless the paragraph contains a Names2 key
+    that was added, removed or given a new value since. Only such a key can change how the
+    paragraph is segmented or translated. A change to any other dictionary invalidates
+    every row.
+
+    Completing a run moves the snapshot to the current state and drops the rows of
+    paragraphs that were not seen again. A stopped run keeps what it converted.
+    """
+
+    def __init__(self, novel_path: str, names2, base_signature: str):
+        """
+        :param novel_path: Path to the novel; the store lives in caches/conversions
+        :param names2: Live Names2 trie
+        :param base_signature: dictionary_signature of the other dictionaries
+        """
+        os.makedirs(STORE_DIR, exist_ok=True)
+        self.path = os.path.join(STORE_DIR, f"{os.path.basename(novel_path)}.db")
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS paragraphs
+                             (hash BLOB PRIMARY KEY, state TEXT, converted TEXT)''')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS names2 (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+        self.names2_entries: Dict[str, str] = qt.snapshot_entries(names2)
+        self.base_signature = base_signature
+        names2_digest = hashlib.sha1(json.dumps(sorted(self.names2_entries.items())).encode('utf-8')).hexdigest()
+        self.state = f"{base_signature}:{names2_digest}"
+
+        meta = dict(self.conn.execute('SELECT key, value FROM meta'))
+        self.snapshot_state: Optional[str] = meta.get("state")
+        self.changed_keys: Optional[set] = None
+        if self.snapshot_state is not None and meta.get("base_signature") == base_signature:
+            snapshot = dict(self.conn.execute('SELECT key, value FROM names2'))
+            self.changed_keys = {key for key in snapshot.keys() | self.names2_entries.keys()
+                                 if snapshot.get(key) != self.names2_entries.get(key)}
+        self.changed_pattern = self._compile_changed_keys()
+
+        self.reused = 0
+        self.converted = 0
+        self._pending_rows: List[Tuple[bytes, str, str]] = []
+        self._pending_restamps: List[Tuple[str, bytes]] = []
+        logging.info(f"Conversion store {self.path}: "
+                     f"{'no reusable snapshot' if self.changed_keys is None else f'{len(self.changed_keys)} changed Names2 keys'}")
+
+    def _compile_changed_keys(self) -> Optional[re.Pattern]:
+        if not self.changed_keys or len(self.changed_keys) > MAX_CHANGED_KEYS:
+            return None
+        return re.compile('|'.join(map(re.escape, sorted(self.changed_keys, key=len, reverse=True))))
+
+    def _snapshot_row_valid(self, paragraph: str) -> bool:
+        if self.changed_keys is None or len(self.changed_keys) > MAX_CHANGED_KEYS:
+            return False
+        if self.changed_pattern is None:
+            return True
+        # Names2 keys are matched against the normalized text, so look for them there
+        return self.changed_pattern.search(qt.replace_special_chars(paragraph)) is None
+
+    def lookup(self, paragraphs: List[str]) -> List[Optional[str]]:
+        """
+        Return the stored conversion of each paragraph that is still valid, None for the others.
+        """
+        hashes = [paragraph_hash(paragraph) for paragraph in paragraphs]
+        rows: Dict[bytes, Tuple[str, str]] = {}
+        unique_hashes = list(set(hashes))
+        for start in range(0, len(unique_hashes), SQLITE_MAX_VARIABLES):
+            chunk = unique_hashes[start:start + SQLITE_MAX_VARIABLES]
+            query = f"SELECT hash, state, converted FROM paragraphs WHERE hash IN ({','.join('?' * len(chunk))})"
+            for row_hash, state, converted in self.conn.execute(query, chunk):
+                rows[row_hash] = (state, converted)
+
+        results: List[Optional[str]] = []
+        for paragraph, row_hash in zip(paragraphs, hashes):
+            row = rows.get(row_hash)
+            if row is not None and (row[0] == self.state or
+                                    (row[0] == self.snapshot_state and self._snapshot_row_valid(paragraph))):
+                if row[0] != self.state:
+                    self._pending_restamps.append((self.state, row_hash))
+                    rows[row_hash] = (self.state, row[1])
+                results.append(row[1])
+                self.reused += 1
+            else:
+                results.append(None)
+        return results
+
+    def save(self, paragraphs: List[str], converted: List[str]) -> None:
+        self._pending_rows.extend((paragraph_hash(paragraph), self.state, result)
+                                  for paragraph, result in zip(paragraphs, converted))
+        self.converted += len(paragraphs)
+        if len(self._pending_rows) + len(self._pending_restamps) >= COMMIT_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO paragraphs (hash, state, converted) VALUES (?, ?, ?)',
+                                  self._pending_rows)
+            self.conn.executemany('UPDATE paragraphs SET state = ? WHERE hash = ?', self._pending_restamps)
+        self._pending_rows.clear()
+        self._pending_restamps.clear()
+
+    def split_batches(self, batches: Iterable[Tuple[List[str], Any]]) -> Iterator[Tuple[List[str], Any]]:
+        """
+        Drop the paragraphs with a valid stored conversion from each batch.
+
+        Yields (paragraphs to convert, tag) where the tag carries what merge needs to put
+        the batch back together.
+        """
+        for batch, tag in batches:
+            stored = self.lookup(batch)
+            yield [paragraph for paragraph, result in zip(batch, stored) if result is None], (batch, stored, tag)
+
+    def merge(self, converted: List[str], tag: Tuple[List[str], List[Optional[str]], Any]) -> Tuple[List[str], Any]:
+        """
+        Fill the newly converted paragraphs into a batch from split_batches and store them.
+
+        :return: (converted batch, original tag)
+        """
+        batch, stored, original_tag = tag
+        self.save([paragraph for paragraph, result in zip(batch, stored) if result is None], converted)
+        fresh = iter(converted)
+        return [result if result is not None else next(fresh) for result in stored], original_tag
+
+    def finish(self, completed: bool) -> None:
+        """
+        Write out pending rows; after a completed run, also move the snapshot to the current state.
+        """
+        self.flush()
+        if completed:
+            with self.conn:
+                self.conn.execute('DELETE FROM paragraphs WHERE state != ?', (self.state,))
+                if self.changed_keys is None:
+                    self.conn.execute('DELETE FROM names2')
+                    self.conn.executemany('INSERT INTO names2 (key, value) VALUES (?, ?)', self.names2_entries.items())
+                else:
+                    self.conn.executemany('DELETE FROM names2 WHERE key = ?', [(key,) for key in self.changed_keys])
+                    self.conn.executemany('INSERT INTO names2 (key, value) VALUES (?, ?)',
+                                          [(key, self.names2_entries[key]) for key in self.changed_keys
+                                           if key in self.names2_entries])
+                self.changed_keys = set()
+                self.conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                      [("state", self.state), ("base_signature", self.base_signature)])
+            self.snapshot_state = self.state
+        logging.info(f"Conversion store: {self.reused} paragraphs reused, {self.converted} converted")
+
+    def close(self) -> None:
+        self.conn.close()
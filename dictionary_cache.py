@@ -0,0 +1,166 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+import logging
+from array import array
+from typing import Dict, List, Any, Optional, Tuple, Union
+
+CACHE_DIR = os.path.join('caches', 'dictionaries')
+MAGIC = b'QTDC'
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+
+Section = Union[str, array, memoryview]
+
+
+def cache_path(name: str) -> str:
+    return os.path.join(CACHE_DIR, f"{name}.qtd")
+
+
+def file_hash(path: str) -> str:
+    """
+    Compute the SHA-1 of a file without loading it into memory at once.
+
+    :param path: Path to the file
+    :return: Hex digest
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(path: str, with_hash: bool = False) -> Dict[str, Any]:
+    """
+    Describe a source file by size and modification time, optionally with its content hash.
+
+    :param path: Path to the source file
+    :param with_hash: Also compute the SHA-1 of the content
+    :return: Fingerprint dictionary stored in the cache header
+    """
+    stat = os.stat(path)
+    result = {"path": os.path.basename(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if with_hash:
+        result["sha1"] = file_hash(path)
+    return result
+
+
+def _sources_match(recorded: List[Dict[str, Any]], source_paths: List[str]) -> bool:
+    if len(recorded) != len(source_paths):
+        return False
+    for record, path in zip(recorded, source_paths):
+        if not os.path.exists(path):
+            return False
+        current = fingerprint(path)
+        if current["size"] != record["size"]:
+            return False
+        # A touched but unchanged file only costs a hash, not a rebuild
+        if current["mtime_ns"] != record["mtime_ns"] and file_hash(path) != record.get("sha1"):
+            return False
+    return True
+
+
+def save(name: str, source_paths: List[str], params: Dict[str, Any], sections: Dict[str, Section],
+         meta: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Write a compiled dictionary to the cache.
+
+    Strings are stored UTF-8 encoded and arrays in native byte order, each section aligned so
+    it can be mapped back with memoryview.cast. The file is written next to the target and
+    swapped in atomically.
+
+    :param name: Cache entry name, e.g. "viet_phrase"
+    :param source_paths: Text files the dictionary was compiled from
+    :param params: Build parameters that must match for the cache to be reused
+    :param sections: Named str/array sections to store
+    :param meta: Extra values returned alongside the sections on load
+    """
+    payloads: List[bytes] = []
+    layout: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for section_name, section in sections.items():
+        if isinstance(section, str):
+            data = section.encode('utf-8')
+            layout[section_name] = {"kind": "str"}
+        else:
+            data = bytes(section) if isinstance(section, memoryview) else section.tobytes()
+            typecode = section.format if isinstance(section, memoryview) else section.typecode
+            layout[section_name] = {"kind": "array", "typecode": typecode}
+        padding = (-offset) % ALIGNMENT
+        payloads.append(b'\0' * padding)
+        offset += padding
+        layout[section_name].update(offset=offset, length=len(data))
+        payloads.append(data)
+        offset += len(data)
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "params": params,
+        "sources": [fingerprint(path, with_hash=True) for path in source_paths],
+        "sections": layout,
+        "meta": meta or {},
+    }).encode('utf-8')
+    # Section offsets are relative to the aligned end of the header
+    prefix = MAGIC + struct.pack('<I', len(header)) + header
+    prefix += b'\0' * ((-len(prefix)) % ALIGNMENT)
+
+    path = cache_path(name)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(prefix)
+            for payload in payloads:
+                f.write(payload)
+        os.replace(temp_path, path)
+    except OSError as e:
+        # On Windows a cache file still mapped by this process cannot be replaced
+        logging.warning(f"Could not write dictionary cache {path}: {str(e)}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load(name: str, source_paths: List[str], params: Dict[str, Any]) -> Optional[Tuple[Dict[str, Section], Dict[str, Any]]]:
+    """
+    Map a cached dictionary if it was built from the current sources with the same params.
+
+    Array sections come back as memoryviews over the mapped file, so no per-entry Python
+    objects are created; only the string sections are decoded.
+
+    :param name: Cache entry name
+    :param source_paths: Text files the dictionary should reflect
+    :param params: Build parameters that must match
+    :return: (sections, meta), or None if the cache is missing or stale
+    """
+    path = cache_path(name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            header_length = struct.unpack('<I', f.read(4))[0]
+            header = json.loads(f.read(header_length).decode('utf-8'))
+            if header.get("version") != FORMAT_VERSION or header.get("params") != params:
+                return None
+            if not _sources_match(header["sources"], source_paths):
+                return None
+            data_start = len(MAGIC) + 4 + header_length
+            data_start += (-data_start) % ALIGNMENT
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        sections: Dict[str, Section] = {}
+        for section_name, section_layout in header["sections"].items():
+            start = data_start + section_layout["offset"]
+            data = view[start:start + section_layout["length"]]
+            if section_layout["kind"] == "str":
+                sections[section_name] = str(data, 'utf-8')
+            else:
+                sections[section_name] = data.cast(section_layout["typecode"])
+        return sections, header["meta"]
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable dictionary cache {path}: {str(e)}")
+        return None
@@ -7,13 +7,17 @@ import subprocess
 import pywinstyles
 import QuickTranslator as qt
 
+# Name CSVs the GUI can open and turn into Names2.txt
+NAMES_CSV_SOURCES = {"HanLP analysis": config.ANALYZED_NAMES_PATH, "Quick Mine": config.MINED_NAMES_PATH}
+
 class GUI:
     def __init__(self, load_novel_callback: Callable, reload_names2_callback: Callable,
                  start_conversion_callback: Callable, stop_conversion_callback: Callable,
                  start_hanlp_callback: Callable, stop_hanlp_callback: Callable,
                  pause_hanlp_callback: Callable, resume_hanlp_callback: Callable,
                  export_names_to_csv_callback: Callable, csv_to_names2_callback: Callable,
-                 reanalyze_hanlp_callback: Callable, tc_to_sc_callback: Callable):
+                 reanalyze_hanlp_callback: Callable, tc_to_sc_callback: Callable,
+                 mine_names_callback: Callable):
         self.load_novel_callback = load_novel_callback
         self.reload_names2_callback = reload_names2_callback
         self.start_conversion_callback = start_conversion_callback
@@ -26,9 +30,11 @@ class GUI:
         self.reanalyze_hanlp_callback = reanalyze_hanlp_callback
         self.csv_to_names2_callback = csv_to_names2_callback
         self.tc_to_sc_callback = tc_to_sc_callback
+        self.mine_names_callback = mine_names_callback
         self.names2_reloaded = False
         self.hanlp_paused = False
         self.min_appearances = 1
+        self.names_csv_source = "HanLP analysis"
         self.conversion_data = None
 
     def create_gui(self):
@@ -166,12 +172,14 @@ class GUI:
             with dpg.group(horizontal=True):
                 dpg.add_button(label="Export Names to CSV", callback=lambda: self.export_names_to_csv_callback(), tag="export_names_button")
                 dpg.add_button(label="Open CSV File", callback=self.open_csv_file, tag="open_csv_button")
+                dpg.add_button(label="Quick Mine Names", callback=lambda: self.mine_names_callback(), tag="mine_names_button")
                 dpg.add_spacer(height=10)
             
             with dpg.group():
                 dpg.add_separator()
+                dpg.add_combo(list(NAMES_CSV_SOURCES), label="CSV Source", default_value=self.names_csv_source, callback=lambda sender, app_data: self.set_names_csv_source(app_data), width=150, tag="names_csv_source_combo")
                 dpg.add_input_int(label="Min Appearances", default_value=self.min_appearances, callback=lambda sender, app_data: self.update_min_appearances(sender, app_data), width=100, tag="min_appearances_input")
-                dpg.add_button(label="CSV To Names2", callback=lambda: self.csv_to_names2_callback(self.min_appearances), tag="csv_to_names2_button")
+                dpg.add_button(label="CSV To Names2", callback=lambda: self.csv_to_names2_callback(self.min_appearances, self.names_csv_path), tag="csv_to_names2_button")
 
     def add_name_analyzing_status_table(self):
         with dpg.table(header_row=True, borders_innerH=True, borders_outerH=True, borders_innerV=True, borders_outerV=True):
@@ -226,8 +234,10 @@ class GUI:
             ("reanalyze_hanlp_button", "Click to reset cache and start a new HanLP analysis"),
             ("hanlp_progress", "Shows the progress of HanLP name analysis"),
             ("export_names_button", "Click to export analyzed names to CSV"),
-            ("open_csv_button", "Click to open the exported CSV file"),
-            ("csv_to_names2_button", "Click to convert CSV data to Names2.txt"),
+            ("open_csv_button", "Click to open the CSV file selected as CSV Source"),
+            ("mine_names_button", "Click to find likely names from character statistics in seconds and export them to a CSV of their own, without HanLP"),
+            ("names_csv_source_combo", "Choose which names CSV to open and convert: HanLP analysis results or Quick Mine candidates (follows the last one exported)"),
+            ("csv_to_names2_button", "Click to convert the CSV selected as CSV Source to Names2.txt"),
             ("min_appearances_input", "Set the minimum number of appearances for a name to be included in Names2.txt")
         ]
 
@@ -389,9 +399,18 @@ class GUI:
             self.hanlp_paused = True
             dpg.configure_item("pause_resume_hanlp_button", label="Resume HanLP")
 
+    @property
+    def names_csv_path(self) -> str:
+        return NAMES_CSV_SOURCES[self.names_csv_source]
+
+    def set_names_csv_source(self, source: str):
+        self.names_csv_source = source
+        if dpg.does_item_exist("names_csv_source_combo"):
+            dpg.set_value("names_csv_source_combo", source)
+
     def open_csv_file(self):
         try:
-            subprocess.Popen(['start', 'AnalyzedNames.csv'], shell=True)
+            subprocess.Popen(['start', self.names_csv_path], shell=True)
         except Exception as e:
             logging.error(f"Error opening CSV file: {str(e)}")
             self.update_status_bar("Error opening CSV file")
@@ -0,0 +1,81 @@
+import time
+import logging
+import itertools
+import threading
+from typing import Any, Dict, Optional
+
+_lock = threading.Lock()
+_load_locks: Dict[str, threading.Lock] = {}
+_models: Dict[str, Any] = {}
+_stats: Dict[str, Dict[str, Any]] = {}
+
+
+def model_memory_bytes(component) -> Optional[int]:
+    """Bytes held by the parameters and buffers of a HanLP component's torch model, if it has one."""
+    module = getattr(component, 'model', None)
+    try:
+        return sum(tensor.numel() * tensor.element_size()
+                   for tensor in itertools.chain(module.parameters(), module.buffers()))
+    except Exception:
+        return None
+
+
+def get_model(kind: str, name: str):
+    """
+    Return a pretrained HanLP model, loading it on first use.
+
+    Every model is loaded at most once per process and shared by all callers; concurrent
+    first calls wait for the same load. HanLP itself is only imported here, so starting
+    the application does not pay for it.
+
+    :param kind: Module under hanlp.pretrained, e.g. "ner" or "tok"
+    :param name: Model constant in that module, e.g. "MSRA_NER_ELECTRA_SMALL_ZH"
+    :return: Loaded HanLP component
+    """
+    with _lock:
+        model = _models.get(name)
+        if model is not None:
+            return model
+        load_lock = _load_locks.setdefault(name, threading.Lock())
+
+    with load_lock:
+        with _lock:
+            model = _models.get(name)
+        if model is not None:
+            return model
+
+        import hanlp
+        start_time = time.perf_counter()
+        model = hanlp.load(getattr(getattr(hanlp.pretrained, kind), name))
+        seconds = time.perf_counter() - start_time
+        memory = model_memory_bytes(model)
+        with _lock:
+            _models[name] = model
+            _stats[name] = {"seconds": seconds, "memory_bytes": memory}
+        logging.info(f"Loaded HanLP model {name} in {seconds:.2f}s"
+                     f"{f', {memory / 2**20:.0f} MB' if memory is not None else ''}")
+        return model
+
+
+def is_loaded(name: str) -> bool:
+    with _lock:
+        return name in _models
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Load time in seconds and model memory in bytes (None if unknown) of each loaded model."""
+    with _lock:
+        return {name: dict(info) for name, info in _stats.items()}
+
+
+def describe() -> str:
+    """One-line summary of the loaded models for the status bar."""
+    loaded = stats()
+    if not loaded:
+        return "No HanLP models loaded"
+    parts = []
+    for name, info in loaded.items():
+        memory = f", {info['memory_bytes'] / 2**20:.0f} MB" if info["memory_bytes"] is not None else ""
+        parts.append(f"{name} ({info['seconds']:.1f}s{memory})")
+    total = sum(info["memory_bytes"] or 0 for info in loaded.values())
+    return f"HanLP models loaded: {', '.join(parts)}; {total / 2**20:.0f} MB in total"
@@ -1,14 +1,19 @@
-import hanlp
 import pandas as pd
 from collections import defaultdict
 import os
 import time
 import sqlite3
-from typing import List, Dict, Tuple, Any
+import threading
+from typing import List, Dict, Tuple, Any, Iterable, Iterator, Optional, Set
 import logging
 import sys
+import queue
 import traceback
 import csv
+import multiprocessing
+import novel_io
+import hanlp_models
+import sentence_segmenter
 
 CATEGORY_TRANSLATION = {
     'PERSON': 'Person Name',
@@ -18,20 +23,53 @@ CATEGORY_TRANSLATION = {
 
 CATEGORY_ORDER = list(CATEGORY_TRANSLATION.values())
 
+# (hanlp.pretrained module, model) of the models used for name analysis
+NER_MODEL = ('ner', 'MSRA_NER_ELECTRA_SMALL_ZH')
+TOKENIZER_MODEL = ('tok', 'CTB9_TOK_ELECTRA_BASE')
+
+# Segments are collected over this many batches, then sorted by length before batching,
+# so each batch pads to similar lengths
+SORT_WINDOW_BATCHES = 8
+MAX_TOKENS = 126
+# Sharded analysis hands out paragraphs to the worker processes in chunks of this size
+SHARD_CHUNK_PARAGRAPHS = 200
+# Seconds a stopped worker gets to finish its current batch before it is terminated
+WORKER_STOP_TIMEOUT = 10.0
+
 class HanLPAnalyzer:
-    def __init__(self, novel_path: str, dictionary_path: str):
+    def __init__(self, novel_path: str, dictionary_path: str, batch_size: int = 32, workers: int = 1,
+                 checkpoint_paragraphs: int = 200, checkpoint_seconds: float = 30.0, prefilter=None):
         self.novel_path = novel_path
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        # A checkpoint is written once either interval has passed since the previous one
+        self.checkpoint_paragraphs = checkpoint_paragraphs
+        self.checkpoint_seconds = checkpoint_seconds
+        # Optional ner_prefilter.SegmentPrefilter; skipped sentences never reach the models
+        self.prefilter = prefilter
         self.dictionary_path = dictionary_path
         self.dictionary_mapping = self.read_dictionary()
         self.novel_text = ""
         self.all_entities = []
         self.entity_info = defaultdict(lambda: {'category': '', 'appearances': 0})
         self.progress = 0
+        # Exact resume point: paragraphs analyzed so far, out of total_paragraphs of the file hashed to novel_hash
+        self.paragraph_offset = 0
+        self.total_paragraphs = 0
+        self.novel_hash: Optional[str] = None
         self.is_paused = False
         self.is_stopped = False
+        # Pause and stop flags shared with the worker processes of a sharded run
+        self.worker_running = None
+        self.worker_stopped = None
         self.cache_path = os.path.join('caches', f"{os.path.basename(novel_path)}.db")
+        # Entities changed since the last checkpoint; only these rows are written
+        self.dirty_entities: Set[str] = set()
+        self.cache_conn: Optional[sqlite3.Connection] = None
+        self.cache_lock = threading.Lock()
+        self.last_checkpoint = (0, time.monotonic())
 
-        # Load models
+        # Shared models from hanlp_models, fetched on first analysis
         self.recognizer = None
         self.tokenizer = None
         self.models_loaded = False
@@ -42,14 +80,15 @@ class HanLPAnalyzer:
                             encoding='utf-8')
 
     def load_models(self):
-        print("Loading HanLP models...")
-        self.recognizer = hanlp.load(hanlp.pretrained.ner.MSRA_NER_ELECTRA_SMALL_ZH)
-        self.tokenizer = hanlp.load(hanlp.pretrained.tok.CTB9_TOK_ELECTRA_BASE)
+        if not self.is_ready():
+            print("Loading HanLP models...")
+        self.recognizer = hanlp_models.get_model(*NER_MODEL)
+        self.tokenizer = hanlp_models.get_model(*TOKENIZER_MODEL)
         self.models_loaded = True
-        print("HanLP models loaded successfully.")
+        print(hanlp_models.describe())
 
     def is_ready(self):
-        return self.models_loaded
+        return self.models_loaded or (hanlp_models.is_loaded(NER_MODEL[1]) and hanlp_models.is_loaded(TOKENIZER_MODEL[1]))
 
     def read_dictionary(self) -> Dict[str, str]:
         mapping = {}
@@ -66,93 +105,230 @@ class HanLPAnalyzer:
     def translate_to_sino_vietnamese(self, chinese_name: str) -> str:
         return ' '.join(self.dictionary_mapping.get(char, char) for char in chinese_name)
 
-    def split_sentence(self, sentence: str, max_chars: int = 126) -> List[str]:
-        if len(sentence) <= max_chars:
-            return [sentence]
-        
-        parts = sentence.split('，')
-        if max(len(part) for part in parts) <= max_chars:
-            return parts
-        
-        return [sentence[i:i+max_chars] for i in range(0, len(sentence), max_chars)]
-
     def read_novel(self):
-        encodings_to_try = ['utf-8', 'gbk', 'gb2312', 'big5', 'ascii']
-        
-        for encoding in encodings_to_try:
+        self.novel_text, encoding = novel_io.read_novel_text(self.novel_path)
+        print(f"Successfully read the file using {encoding} encoding.")
+
+    def iter_segments(self, paragraph: str) -> Iterator[str]:
+        keep = self.prefilter.may_contain_new_name if self.prefilter is not None else None
+        return sentence_segmenter.iter_segments(paragraph, max_chars=MAX_TOKENS, keep=keep)
+
+    def segment_paragraphs(self, paragraphs: Iterable[str]) -> Iterator[List[str]]:
+        for paragraph in paragraphs:
+            yield list(self.iter_segments(paragraph))
+
+    def recognize_segment(self, segment: str) -> Optional[List[Any]]:
+        try:
+            tokens = self.tokenizer(segment)
+            if len(tokens) > MAX_TOKENS:
+                print(f"Warning: Segment still too long: {len(tokens)} tokens")
+                return None
+            return self.recognizer(tokens)
+        except Exception as e:
+            logging.error(f"Error during HanLP analysis: {e}")
+            logging.error(f"Segment causing error: {segment}")
+            logging.error(f"Full traceback: {traceback.format_exc()}")
+            return None
+
+    def recognize_segments(self, segments: List[str]) -> List[Optional[List[Any]]]:
+        """
+        Run the tokenizer and NER over segments in batches of self.batch_size.
+
+        Segments are sorted by length before batching so little padding is computed. A batch
+        that fails is retried one segment at a time, so one bad segment only loses itself.
+
+        :param segments: Sentence segments
+        :return: Entities per segment in input order, None for skipped or failed segments
+        """
+        if self.batch_size == 1:
+            return [self.recognize_segment(segment) for segment in segments]
+
+        results: List[Optional[List[Any]]] = [None] * len(segments)
+        order = sorted(range(len(segments)), key=lambda index: len(segments[index]))
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
             try:
-                with open(self.novel_path, 'r', encoding=encoding) as file:
-                    self.novel_text = file.read()
-                print(f"Successfully read the file using {encoding} encoding.")
-                return
-            except UnicodeDecodeError:
-                print(f"Failed to read with {encoding} encoding.")
-        
-        print("Failed to read the file with any of the attempted encodings.")
-        raise ValueError("Unable to read the novel file")
+                token_lists = self.tokenizer([segments[index] for index in indices])
+                valid = []
+                for index, tokens in zip(indices, token_lists):
+                    if len(tokens) > MAX_TOKENS:
+                        print(f"Warning: Segment still too long: {len(tokens)} tokens")
+                    else:
+                        valid.append((index, tokens))
+                if valid:
+                    entity_lists = self.recognizer([tokens for _, tokens in valid])
+                    for (index, _), entities in zip(valid, entity_lists):
+                        results[index] = entities
+            except Exception as e:
+                logging.warning(f"Batched HanLP analysis failed, retrying segment by segment: {e}")
+                for index in indices:
+                    results[index] = self.recognize_segment(segments[index])
+        return results
+
+    def iter_paragraph_entities(self, paragraph_segments: Iterable[List[str]]) -> Iterator[Tuple[int, List[List[Any]]]]:
+        """
+        Analyze paragraphs, yielding after each window of batches goes through the models.
+
+        Segments of several paragraphs go through the models together, so only the paragraphs
+        whose segments have all been analyzed are reported as done.
+
+        :param paragraph_segments: Segments of each paragraph, from segment_paragraphs
+        :return: Iterator of (paragraphs done so far, entity lists recognized since the last yield)
+        """
+        window = self.batch_size * SORT_WINDOW_BATCHES if self.batch_size > 1 else 1
+        pending_segments: List[str] = []
+        done = reported = 0
+        for done, segments in enumerate(paragraph_segments, 1):
+            pending_segments.extend(segments)
+            if len(pending_segments) >= window:
+                results = self.recognize_segments(pending_segments)
+                pending_segments = []
+                reported = done
+                yield done, [entities for entities in results if entities is not None]
+        if done > reported:
+            results = self.recognize_segments(pending_segments)
+            yield done, [entities for entities in results if entities is not None]
 
     def analyze(self, progress_callback=None):
-        if not self.models_loaded:
-            self.load_models()
-
         try:
             self.read_novel()
             paragraphs = self.novel_text.split('\n')
             total_paragraphs = len(paragraphs)
 
             # Load cache if exists
-            if self.load_cache():
-                self.progress = len(self.entity_info) / total_paragraphs
+            if self.load_cache() and progress_callback:
+                progress_callback(self.progress)
+            self.novel_hash = novel_io.file_digest(self.novel_path)
+            self.total_paragraphs = total_paragraphs
+
+            start_paragraph = self.paragraph_offset
+            if self.prefilter is not None:
+                self.prefilter.reset_counts()
+            if self.workers > 1 and total_paragraphs - start_paragraph > SHARD_CHUNK_PARAGRAPHS:
+                self.analyze_sharded(paragraphs, start_paragraph, progress_callback)
+                self.log_prefilter_counts()
+                return
+
+            if not self.models_loaded:
+                self.load_models()
+            self.last_checkpoint = (start_paragraph, time.monotonic())
+            for done, entity_lists in self.iter_paragraph_entities(self.segment_paragraphs(paragraphs[start_paragraph:])):
+                for entities in entity_lists:
+                    self.all_entities.append(entities)
+                    self.update_entity_info(entities)
+
+                self.paragraph_offset = start_paragraph + done
+                self.progress = self.paragraph_offset / total_paragraphs
                 if progress_callback:
                     progress_callback(self.progress)
 
-            start_paragraph = int(self.progress * total_paragraphs)
+                if self.checkpoint_due():
+                    self.cache_progress()
 
-            for i, paragraph in enumerate(paragraphs[start_paragraph:], start=start_paragraph):
                 if self.is_stopped:
                     break
-                while self.is_paused:
+                while self.is_paused and not self.is_stopped:
                     time.sleep(0.1)
-                
-                sentences = []
-                current_sentence = ""
-                for char in paragraph:
-                    current_sentence += char
-                    if char in ['。', '！', '？']:
-                        sentences.append(current_sentence)
-                        current_sentence = ""
-                if current_sentence:
-                    sentences.append(current_sentence)
-
-                for sentence in sentences:
-                    if sentence:
-                        segments = self.split_sentence(sentence)
-                        for segment in segments:
-                            try:
-                                tokens = self.tokenizer(segment)
-                                if len(tokens) > 126:
-                                    print(f"Warning: Segment still too long: {len(tokens)} tokens")
-                                    continue
-                                entities = self.recognizer(tokens)
-                                self.all_entities.append(entities)
-                                self.update_entity_info(entities)
-                            except Exception as e:
-                                logging.error(f"Error during HanLP analysis: {e}")
-                                logging.error(f"Segment causing error: {segment}")
-                                logging.error(f"Full traceback: {traceback.format_exc()}")
-
-                self.progress = (i + 1) / total_paragraphs
-                if progress_callback:
-                    progress_callback(self.progress)
-
-                if (i + 1) % 10 == 0:  # Cache every 10 paragraphs
-                    self.cache_progress()
 
             self.cache_progress()  # Final cache
+            self.log_prefilter_counts()
         except Exception as e:
             logging.error(f"Error during analysis: {e}")
             logging.error(f"Full traceback: {traceback.format_exc()}")
 
+    def analyze_sharded(self, paragraphs: List[str], start_paragraph: int, progress_callback=None):
+        """
+        Analyze paragraphs across self.workers processes, each loading the models once.
+
+        Workers take chunks of SHARD_CHUNK_PARAGRAPHS paragraphs from a shared queue. Their
+        entity counts are merged in chunk order, so entity_info and the cached progress always
+        describe a prefix of the novel and a stopped run resumes exactly where it left off.
+        The progress callback also counts work finished out of order or inside a chunk.
+        Paragraphs are segmented (and pre-filtered) here, a few chunks ahead of the workers.
+        all_entities is not filled in this mode.
+        """
+        total_paragraphs = len(paragraphs)
+        chunk_ends = list(range(start_paragraph + SHARD_CHUNK_PARAGRAPHS, total_paragraphs, SHARD_CHUNK_PARAGRAPHS))
+        chunk_ends.append(total_paragraphs)
+        chunk_starts = [start_paragraph] + chunk_ends[:-1]
+        workers = min(self.workers, len(chunk_ends))
+
+        # Spawned, so that no worker inherits the threads of a parent that already runs the models
+        context = multiprocessing.get_context('spawn')
+        tasks = context.Queue()
+        results = context.Queue()
+        self.worker_running = context.Event()
+        self.worker_stopped = context.Event()
+        if not self.is_paused:
+            self.worker_running.set()
+
+        queued = 0
+
+        def queue_chunk():
+            nonlocal queued
+            if queued < len(chunk_ends):
+                tasks.put((queued, list(self.segment_paragraphs(paragraphs[chunk_starts[queued]:chunk_ends[queued]]))))
+                queued += 1
+                if queued == len(chunk_ends):
+                    for _ in range(workers):
+                        tasks.put(None)
+
+        processes = [context.Process(target=_analysis_worker, daemon=True,
+                                     args=(self.novel_path, self.dictionary_path, self.batch_size, tasks, results,
+                                           self.worker_running, self.worker_stopped))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        logging.info(f"Sharded HanLP analysis: {len(chunk_ends)} chunks across {workers} workers")
+        for _ in range(workers * 2):
+            queue_chunk()
+
+        self.last_checkpoint = (start_paragraph, time.monotonic())
+        finished: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        next_chunk = 0
+        paragraphs_done = 0
+        try:
+            while next_chunk < len(chunk_ends) and not self.is_stopped:
+                try:
+                    message = results.get(timeout=0.5)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        raise RuntimeError("HanLP analysis workers exited before finishing")
+                    continue
+
+                if message[0] == 'error':
+                    raise RuntimeError(f"HanLP analysis worker failed:\n{message[1]}")
+                if message[0] == 'progress':
+                    paragraphs_done += message[1]
+                    if progress_callback:
+                        progress_callback((start_paragraph + paragraphs_done) / total_paragraphs)
+                    continue
+
+                _, index, counts = message
+                finished[index] = counts
+                queue_chunk()
+                while next_chunk in finished:
+                    for name, info in finished.pop(next_chunk).items():
+                        self.entity_info[name]['category'] = info['category']
+                        self.entity_info[name]['appearances'] += info['appearances']
+                        self.dirty_entities.add(name)
+                    self.paragraph_offset = chunk_ends[next_chunk]
+                    self.progress = self.paragraph_offset / total_paragraphs
+                    if self.checkpoint_due():
+                        self.cache_progress()
+                    next_chunk += 1
+        finally:
+            self.worker_stopped.set()
+            self.worker_running.set()
+            for process in processes:
+                process.join(WORKER_STOP_TIMEOUT)
+                if process.is_alive():
+                    process.terminate()
+            tasks.cancel_join_thread()
+            results.cancel_join_thread()
+            self.worker_running = self.worker_stopped = None
+            self.cache_progress()
+
     def update_entity_info(self, entities: List[Any]):
         try:
             for entity in entities:
@@ -170,33 +346,58 @@ class HanLPAnalyzer:
 
                 self.entity_info[name]['category'] = category
                 self.entity_info[name]['appearances'] += 1
+                self.dirty_entities.add(name)
         except Exception as e:
             logging.error(f"Error in update_entity_info: {e}")
             logging.error(f"Entities causing error: {entities}")
             logging.error(f"Entity type: {type(entities)}")
             logging.error(f"Full traceback: {traceback.format_exc()}")
 
+    def open_cache(self) -> sqlite3.Connection:
+        """Return the cache connection, opening it in WAL mode on first use."""
+        if self.cache_conn is None:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            # Checkpoints are written from the analysis thread, the cache is loaded and reset from the GUI thread
+            self.cache_conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self.cache_conn.execute('PRAGMA journal_mode=WAL')
+            self.cache_conn.execute('PRAGMA synchronous=NORMAL')
+            self.cache_conn.execute('''CREATE TABLE IF NOT EXISTS entities
+                                       (entity TEXT PRIMARY KEY, category TEXT, appearances INTEGER)''')
+            self.cache_conn.execute('''CREATE TABLE IF NOT EXISTS checkpoint
+                                       (id INTEGER PRIMARY KEY, paragraph INTEGER, total_paragraphs INTEGER,
+                                        novel_hash TEXT)''')
+        return self.cache_conn
+
+    def close_cache(self):
+        with self.cache_lock:
+            if self.cache_conn is not None:
+                self.cache_conn.close()
+                self.cache_conn = None
+
+    def checkpoint_due(self) -> bool:
+        last_paragraph, last_time = self.last_checkpoint
+        return (self.paragraph_offset - last_paragraph >= self.checkpoint_paragraphs or
+                time.monotonic() - last_time >= self.checkpoint_seconds)
+
     def cache_progress(self):
+        """
+        Write the entities changed since the last checkpoint and the resume point in one transaction.
+
+        The resume point is the exact paragraph offset, stored with a hash of the novel file so
+        the checkpoint is never applied to another file or another version of it.
+        """
         try:
-            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
-            conn = sqlite3.connect(self.cache_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS entities
-                              (entity TEXT PRIMARY KEY, category TEXT, appearances INTEGER)''')
-            
-            cursor.execute('''CREATE TABLE IF NOT EXISTS progress
-                              (id INTEGER PRIMARY KEY, progress REAL)''')
-            
-            for entity, info in self.entity_info.items():
-                cursor.execute('''INSERT OR REPLACE INTO entities (entity, category, appearances)
-                                  VALUES (?, ?, ?)''', (entity, info['category'], info['appearances']))
-            
-            cursor.execute('''INSERT OR REPLACE INTO progress (id, progress)
-                              VALUES (1, ?)''', (self.progress,))
-            
-            conn.commit()
-            conn.close()
+            with self.cache_lock:
+                conn = self.open_cache()
+                rows = [(entity, self.entity_info[entity]['category'], self.entity_info[entity]['appearances'])
+                        for entity in self.dirty_entities]
+                with conn:
+                    conn.executemany('''INSERT OR REPLACE INTO entities (entity, category, appearances)
+                                          VALUES (?, ?, ?)''', rows)
+                    conn.execute('''INSERT OR REPLACE INTO checkpoint (id, paragraph, total_paragraphs, novel_hash)
+                                      VALUES (1, ?, ?, ?)''', (self.paragraph_offset, self.total_paragraphs, self.novel_hash))
+                self.dirty_entities.clear()
+            self.last_checkpoint = (self.paragraph_offset, time.monotonic())
         except Exception as e:
             logging.error(f"Error in cache_progress: {e}")
             logging.error(f"Full traceback: {traceback.format_exc()}")
@@ -204,20 +405,25 @@ class HanLPAnalyzer:
     def load_cache(self):
         try:
             if os.path.exists(self.cache_path):
-                conn = sqlite3.connect(self.cache_path)
-                cursor = conn.cursor()
-                
-                cursor.execute('SELECT entity, category, appearances FROM entities')
-                for entity, category, appearances in cursor.fetchall():
-                    self.entity_info[entity]['category'] = category
-                    self.entity_info[entity]['appearances'] = appearances
-                
-                cursor.execute('SELECT progress FROM progress WHERE id = 1')
-                result = cursor.fetchone()
-                if result:
-                    self.progress = result[0]
-                
-                conn.close()
+                novel_hash = novel_io.file_digest(self.novel_path)
+                with self.cache_lock:
+                    conn = self.open_cache()
+                    checkpoint = conn.execute('SELECT paragraph, total_paragraphs, novel_hash FROM checkpoint WHERE id = 1').fetchone()
+                if checkpoint is None or checkpoint[2] != novel_hash:
+                    # Caches of older versions carry no checkpoint; neither can be resumed safely
+                    logging.warning(f"Discarding analysis cache {self.cache_path}: it was not built from this version of the novel")
+                    print("Analysis cache belongs to a different version of the novel; starting over.")
+                    self.reset_cache()
+                    return False
+
+                with self.cache_lock:
+                    self.entity_info.clear()
+                    self.dirty_entities.clear()
+                    for entity, category, appearances in conn.execute('SELECT entity, category, appearances FROM entities'):
+                        self.entity_info[entity]['category'] = category
+                        self.entity_info[entity]['appearances'] = appearances
+                self.paragraph_offset, self.total_paragraphs, self.novel_hash = checkpoint
+                self.progress = self.paragraph_offset / self.total_paragraphs if self.total_paragraphs else 0
                 return True
             return False
         except Exception as e:
@@ -225,10 +431,10 @@ class HanLPAnalyzer:
             logging.error(f"Full traceback: {traceback.format_exc()}")
             return False
 
-    def export_to_csv(self, output_file: str = 'AnalyzedNames.csv'):
+    def export_to_csv(self, output_file: str = 'AnalyzedNames.csv', entity_info: Optional[Dict[str, Dict[str, Any]]] = None):
         try:
             data = []
-            for entity, info in self.entity_info.items():
+            for entity, info in (self.entity_info if entity_info is None else entity_info).items():
                 sino_vietnamese_name = self.translate_to_sino_vietnamese(entity)
                 data.append({
                     'Category': CATEGORY_TRANSLATION.get(info['category'], info['category']),
@@ -273,6 +479,13 @@ class HanLPAnalyzer:
             logging.error(f"Error in export_to_names2: {e}")
             logging.error(f"Full traceback: {traceback.format_exc()}")
 
+    def log_prefilter_counts(self):
+        if self.prefilter is not None and self.prefilter.checked:
+            message = (f"NER pre-filter skipped {self.prefilter.skipped} of {self.prefilter.checked} sentences "
+                       f"({self.prefilter.skipped / self.prefilter.checked:.1%})")
+            logging.info(message)
+            print(message)
+
     def get_status(self) -> Dict[str, int]:
         status = {category: 0 for category in CATEGORY_TRANSLATION.values()}
         for info in self.entity_info.values():
@@ -283,20 +496,67 @@ class HanLPAnalyzer:
 
     def pause(self):
         self.is_paused = True
+        if self.worker_running is not None:
+            self.worker_running.clear()
 
     def resume(self):
         self.is_paused = False
+        if self.worker_running is not None:
+            self.worker_running.set()
 
     def stop(self):
         self.is_stopped = True
+        if self.worker_stopped is not None:
+            self.worker_stopped.set()
 
     def reset_cache(self):
-        if os.path.exists(self.cache_path):
-            os.remove(self.cache_path)
+        self.close_cache()
+        for path in (self.cache_path, f"{self.cache_path}-wal", f"{self.cache_path}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
         self.progress = 0
+        self.paragraph_offset = 0
         self.entity_info.clear()
+        self.dirty_entities.clear()
         self.all_entities.clear()
 
+
+def _analysis_worker(novel_path: str, dictionary_path: str, batch_size: int, tasks, results,
+                     running, stopped) -> None:
+    """
+    Worker process of HanLPAnalyzer.analyze_sharded.
+
+    Loads the models once, then analyzes chunks of segmented paragraphs until it takes the
+    None sentinel, posting ('progress', paragraphs) after every batch window and
+    ('chunk', index, entity counts) after every chunk. Waits after a batch window while
+    paused; a stopped chunk is dropped.
+    """
+    try:
+        analyzer = HanLPAnalyzer(novel_path, dictionary_path, batch_size=batch_size)
+        analyzer.load_models()
+        while not stopped.is_set():
+            task = tasks.get()
+            if task is None:
+                break
+            index, paragraph_segments = task
+            analyzer.entity_info.clear()
+            analyzer.dirty_entities.clear()
+            reported = 0
+            for done, entity_lists in analyzer.iter_paragraph_entities(paragraph_segments):
+                for entities in entity_lists:
+                    analyzer.update_entity_info(entities)
+                results.put(('progress', done - reported))
+                reported = done
+                while not running.wait(0.1):
+                    if stopped.is_set():
+                        break
+                if stopped.is_set():
+                    return
+            results.put(('chunk', index, dict(analyzer.entity_info)))
+    except Exception:
+        results.put(('error', traceback.format_exc()))
+
+
 # Usage example:
 # analyzer = HanLPAnalyzer('path_to_novel.txt', 'path_to_ChinesePhienAmWords.txt')
 # analyzer.analyze(progress_callback=lambda p: print(f"Progress: {p*100:.2f}%"))
@@ -0,0 +1,175 @@
+import re
+import math
+import operator
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from ner_prefilter import COMMON_SURNAMES, FUNCTION_CHARS
+
+MAX_NAME_LENGTH = 4
+# The novel is counted in blocks of about this many characters; see NameMiner
+BLOCK_CHARS = 200000
+
+MIN_APPEARANCES = 5
+# Minimum branching entropy (nats) on both sides: a name is followed and preceded by many different characters
+MIN_ENTROPY = 1.0
+# Minimum log of how much more often the parts of a candidate occur together than by chance
+MIN_COHESION = 3.0
+# A candidate is dropped when a longer candidate containing it accounts for this share of its appearances
+SUBSUMED_RATIO = 0.8
+
+TITLES = ['师兄', '师姐', '师弟', '师妹', '师父', '师尊', '公子', '小姐', '姑娘', '少爷', '夫人', '先生', '大人',
+          '将军', '殿下', '陛下', '长老', '掌门', '宗主', '道友', '前辈', '真人', '老祖', '大师', '公主', '王爷']
+LOCATION_SUFFIXES = frozenset('城山峰谷河江湖海州县村镇岛国省岭林关洲郡府')
+ORGANIZATION_SUFFIXES = frozenset('宗门派帮阁宫殿会盟教院堂楼寺观')
+
+TITLE_PATTERN = re.compile('|'.join(TITLES))
+# Names never span a grammatical particle, so particles end a run like punctuation does
+PARTICLE_TABLE = str.maketrans({char: ' ' for char in FUNCTION_CHARS})
+
+
+class NameMiner:
+    """
+    Find likely names from character statistics alone, in one streaming pass.
+
+    The text is counted in blocks with C-level Counter updates: every n-gram of up to
+    MAX_NAME_LENGTH + 1 characters between punctuation and particles, plus the strings just
+    before a title such as 师兄 or 长老. An n-gram is only tracked from the first block in
+    which it occurs twice, after which every occurrence counts. Strings that occur once
+    never enter the counters, which keeps them compact; a name loses at most its
+    occurrences before that block.
+
+    candidates() then scores each n-gram of 2 to MAX_NAME_LENGTH characters on frequency,
+    on the left and right branching entropy derived from the (n+1)-gram counts, and on
+    cohesion, and gives it a category from surname, title and place/organization
+    suffix evidence.
+    """
+
+    def __init__(self, max_length: int = MAX_NAME_LENGTH, block_chars: int = BLOCK_CHARS):
+        self.max_length = max_length
+        self.block_chars = block_chars
+        # counts[n] holds the n-grams; the longest ones are only used as neighbors
+        self.counts: List[Counter] = [Counter() for _ in range(max_length + 2)]
+        self.title_counts: Counter = Counter()
+        self._buffer: List[str] = []
+        self._buffered = 0
+
+    def feed(self, text: str) -> None:
+        """Add a paragraph (or several); n-grams are never counted across calls that end a block."""
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.block_chars:
+            self._count_block()
+
+    def finish(self) -> None:
+        if self._buffer:
+            self._count_block()
+
+    def _count_block(self) -> None:
+        block = '\n'.join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+
+        for match in TITLE_PATTERN.finditer(block):
+            start = match.start()
+            for length in range(2, self.max_length + 1):
+                self.title_counts[block[max(0, start - length):start]] += 1
+
+        # The whole block is cut into n-grams at once; the ones crossing punctuation, spaces
+        # or particles are not alphabetic and are dropped while merging
+        text = block.translate(PARTICLE_TABLE)
+        grams = text
+        self.counts[1].update(Counter(text))
+        for n, counts in enumerate(self.counts[2:], 2):
+            grams = list(map(operator.add, grams, text[n - 1:]))
+            for gram, count in Counter(grams).items():
+                if (count > 1 or gram in counts) and gram.isalpha():
+                    counts[gram] += count
+
+    def _count(self, gram: str) -> int:
+        return self.counts[len(gram)].get(gram, 0)
+
+    @staticmethod
+    def _entropy(total: int, neighbor_counts: List[int]) -> float:
+        # Occurrences next to a boundary, or next to untracked strings, count as distinct neighbors
+        entropy = -sum(count / total * math.log(count / total) for count in neighbor_counts)
+        boundary = total - sum(neighbor_counts)
+        if boundary > 0:
+            entropy += boundary / total * math.log(total)
+        return entropy
+
+    def _category(self, gram: str) -> Optional[str]:
+        if gram[-1] in ORGANIZATION_SUFFIXES:
+            return 'ORGANIZATION'
+        if gram[-1] in LOCATION_SUFFIXES:
+            return 'LOCATION'
+        if gram[0] in COMMON_SURNAMES or self.title_counts.get(gram):
+            return 'PERSON'
+        return None
+
+    def candidates(self, min_appearances: int = MIN_APPEARANCES, min_entropy: float = MIN_ENTROPY,
+                   min_cohesion: float = MIN_COHESION,
+                   is_known: Optional[Callable[[str], bool]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Score the counted n-grams and return the likely names.
+
+        :param min_appearances: Fewest appearances of a candidate
+        :param min_entropy: Fewest nats of branching entropy on each side
+        :param min_cohesion: Lowest log ratio of the candidate's count to the count its parts
+                             would give if they were independent
+        :param is_known: Words to leave out, e.g. common VietPhrase words
+        :return: {name: {'category': 'PERSON' | 'LOCATION' | 'ORGANIZATION', 'appearances': n}},
+                 the shape of HanLPAnalyzer.entity_info
+        """
+        self.finish()
+        total_chars = sum(count for char, count in self.counts[1].items() if char.isalpha())
+        frequent = {gram: count for counts in self.counts[2:self.max_length + 1]
+                    for gram, count in counts.items() if count >= min_appearances}
+
+        left: Dict[str, List[int]] = {}
+        right: Dict[str, List[int]] = {}
+        for counts in self.counts[3:]:
+            for gram, count in counts.items():
+                if gram[:-1] in frequent:
+                    right.setdefault(gram[:-1], []).append(count)
+                if gram[1:] in frequent:
+                    left.setdefault(gram[1:], []).append(count)
+
+        scored: Dict[str, Dict[str, Any]] = {}
+        for gram, count in frequent.items():
+            category = self._category(gram)
+            if category is None or (is_known is not None and is_known(gram)):
+                continue
+            if min(self._entropy(count, left.get(gram, [])), self._entropy(count, right.get(gram, []))) < min_entropy:
+                continue
+            # Parts that are not tracked occurred at least as often as the candidate itself
+            cohesion = min(math.log(total_chars * count /
+                                    (max(self._count(gram[:i]), count) * max(self._count(gram[i:]), count)))
+                           for i in range(1, len(gram)))
+            if cohesion < min_cohesion:
+                continue
+            scored[gram] = {'category': category, 'appearances': count}
+
+        for gram in sorted(scored, key=len, reverse=True):
+            count = scored[gram]['appearances']
+            for length in range(2, len(gram)):
+                for start in range(len(gram) - length + 1):
+                    part = scored.get(gram[start:start + length])
+                    if part is not None and count >= SUBSUMED_RATIO * part['appearances']:
+                        part['subsumed'] = True
+        return {gram: info for gram, info in scored.items() if not info.pop('subsumed', False)}
+
+
+def mine_names(text: str, is_known: Optional[Callable[[str], bool]] = None, **thresholds) -> Dict[str, Dict[str, Any]]:
+    """
+    Mine name candidates from a whole novel, paragraph by paragraph.
+
+    :param text: Novel text
+    :param is_known: Words to leave out
+    :param thresholds: Overrides for NameMiner.candidates
+    :return: Candidates in the shape of HanLPAnalyzer.entity_info
+    """
+    miner = NameMiner()
+    for paragraph in text.split('\n'):
+        miner.feed(paragraph)
+    return miner.candidates(is_known=is_known, **thresholds)
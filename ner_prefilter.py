@@ -0,0 +1,87 @@
+import threading
+
+import QuickTranslator as qt
+
+# Surnames that start most names; one outside a longer dictionary word marks a likely name
+COMMON_SURNAMES = frozenset(
+    '王李张刘陈杨黄赵吴周徐孙马朱胡郭何林罗高郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘蒋蔡余杜叶程苏魏吕丁任沈姚卢'
+    '姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔汤'
+    # First characters of compound surnames that are not common words on their own
+    '欧慕诸')
+# Grammatical characters that practically never occur inside a name
+FUNCTION_CHARS = frozenset('的了着过是在有和与及或而但也都还又就才便再很太更最不没别把被让给对向从往到为以于之其'
+                           '这那哪此个些么吗呢吧啊呀哦嘛我你他她它们')
+
+
+def is_han(char: str) -> bool:
+    return '一' <= char <= '鿿' or '㐀' <= char <= '䶿'
+
+
+class SegmentPrefilter:
+    """
+    Decide from the dictionaries whether a segment is worth running NER on.
+
+    The segment is walked with the same merged matcher the conversion uses. Anything matched
+    as a word of two or more characters is already known: a Names2/Names entry or a
+    VietPhrase word. What is left are single characters. A segment is kept when they contain
+    a surname followed by another Han character, or a run of at least min_run characters
+    that are not grammatical particles. Otherwise any name in it is already in the
+    dictionaries, and the segment is skipped.
+
+    Appearances of dictionary names in skipped segments are therefore not counted, which
+    only matters for names that are already in Names2.
+    """
+
+    def __init__(self, names2, names, viet_phrase, min_run: int = 2):
+        """
+        :param names2: Live Names2 trie; edits made while analyzing are picked up
+        :param names: Names trie
+        :param viet_phrase: VietPhrase trie
+        :param min_run: Unknown characters in a row that make a segment worth analyzing
+        """
+        self.names2 = names2
+        self.names = names
+        self.viet_phrase = viet_phrase
+        self.min_run = min_run
+        self.checked = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def may_contain_new_name(self, segment: str) -> bool:
+        matcher = qt.get_matcher(self.names2, self.names, self.viet_phrase)
+        keep = self._scan(segment, matcher)
+        with self._lock:
+            self.checked += 1
+            self.skipped += not keep
+        return keep
+
+    def _scan(self, segment: str, matcher) -> bool:
+        end = len(segment)
+        run = 0
+        i = 0
+        while i < end:
+            char = segment[i]
+            if not is_han(char):
+                run = 0
+                i += 1
+                continue
+            length = matcher.match(segment, i, end)[0]
+            if length >= 2:
+                run = 0
+                i += length
+                continue
+            if char in COMMON_SURNAMES and i + 1 < end and is_han(segment[i + 1]):
+                return True
+            if char in FUNCTION_CHARS:
+                run = 0
+            else:
+                run += 1
+                if run >= self.min_run:
+                    return True
+            i += 1
+        return False
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.checked = 0
+            self.skipped = 0
@@ -0,0 +1,208 @@
+import os
+import codecs
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+ENCODINGS_TO_TRY = ['utf-8', 'gbk', 'gb2312', 'big5']
+# Bytes sampled to pick a codec; leading ASCII is skipped as it fits every candidate
+SAMPLE_BYTES = 64 * 1024
+# Block size for checking the picked codec against the whole file
+VALIDATE_BLOCK_BYTES = 1024 * 1024
+# The decoded text of the most recent novel is kept for the other readers up to this size
+TEXT_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+FileKey = Tuple[str, int, int]
+
+_lock = threading.Lock()
+_encoding_cache: Dict[FileKey, str] = {}
+# Codecs known to decode the whole file, from a full read or from detect_stream_encoding
+_validated_cache: Dict[FileKey, str] = {}
+_digest_cache: Dict[FileKey, str] = {}
+_text_cache: Optional[Tuple[FileKey, str, str]] = None
+
+
+def _file_key(file_path: str) -> FileKey:
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+
+def _read_sample(file_path: str) -> Tuple[bytes, bool]:
+    """
+    Read the first non-ASCII block of a file.
+
+    A block that is entirely ASCII ends on a character boundary in every candidate codec,
+    so the next block can be decoded on its own.
+
+    :return: (sample, whether the sample reaches the end of the file)
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(SAMPLE_BYTES)
+        while sample.isascii():
+            block = f.read(SAMPLE_BYTES)
+            if not block:
+                return sample, True
+            sample = block
+        return sample, not f.peek(1)
+
+
+def _decodes(sample: bytes, encoding: str, final: bool) -> bool:
+    try:
+        codecs.getincrementaldecoder(encoding)(errors='strict').decode(sample, final=final)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _decodes_file(file_path: str, encoding: str) -> bool:
+    """Decode a whole file block by block, keeping none of the text, to check that a codec fits all of it."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='strict')
+    try:
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(VALIDATE_BLOCK_BYTES), b''):
+                decoder.decode(block)
+        decoder.decode(b'', final=True)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def detect_encoding(file_path: str) -> str:
+    """
+    Pick the codec of a novel from a sample of its bytes.
+
+    Candidates are tried in the same order as the full-decode retries used to be, but only
+    on a sample, and the result is cached per path and modification time. The codec may
+    still fail further into the file; read_novel_text falls back on the other candidates,
+    readers without such a fallback use detect_stream_encoding.
+
+    :param file_path: Path to the novel
+    :return: Codec name
+    """
+    key = _file_key(file_path)
+    with _lock:
+        encoding = _validated_cache.get(key) or _encoding_cache.get(key)
+    if encoding:
+        return encoding
+
+    sample, at_end = _read_sample(file_path)
+    for encoding in ENCODINGS_TO_TRY:
+        if _decodes(sample, encoding, at_end):
+            with _lock:
+                _encoding_cache[key] = encoding
+                if at_end:
+                    _validated_cache[key] = encoding
+            return encoding
+    raise ValueError("Unable to read the novel file with any of the attempted encodings.")
+
+
+def detect_stream_encoding(file_path: str) -> str:
+    """
+    Pick a codec that decodes the whole novel, for readers that stream it with no fallback.
+
+    Starting from the sampled codec, each candidate is checked against the whole file with
+    an incremental decoder that keeps none of the text. Free once read_novel_text has
+    decoded the same file.
+
+    :param file_path: Path to the novel
+    :return: Codec name
+    """
+    key = _file_key(file_path)
+    with _lock:
+        encoding = _validated_cache.get(key)
+    if encoding:
+        return encoding
+
+    detected = detect_encoding(file_path)
+    for encoding in ENCODINGS_TO_TRY[ENCODINGS_TO_TRY.index(detected):]:
+        if _decodes_file(file_path, encoding):
+            with _lock:
+                _encoding_cache[key] = encoding
+                _validated_cache[key] = encoding
+            return encoding
+        logging.warning(f"{os.path.basename(file_path)} does not decode as {encoding} past its first bytes.")
+    raise ValueError("Unable to read the novel file with any of the attempted encodings.")
+
+
+def read_novel_text(file_path: str) -> Tuple[str, str]:
+    """
+    Read a whole novel, decoding it once per session.
+
+    The codec is picked from a sample only. If it fails further into the file, the
+    remaining candidates are tried on the full text as before.
+
+    :param file_path: Path to the novel
+    :return: (novel text, codec name)
+    """
+    global _text_cache
+    key = _file_key(file_path)
+    with _lock:
+        if _text_cache is not None and _text_cache[0] == key:
+            return _text_cache[1], _text_cache[2]
+
+    detected = detect_encoding(file_path)
+    for encoding in ENCODINGS_TO_TRY[ENCODINGS_TO_TRY.index(detected):]:
+        try:
+            with open(file_path, 'r', encoding=encoding) as file:
+                novel_text = file.read()
+        except UnicodeDecodeError:
+            logging.warning(f"Failed to read {os.path.basename(file_path)} with {encoding} encoding.")
+            continue
+        logging.info(f"Successfully read the novel file using {encoding} encoding.")
+        with _lock:
+            _encoding_cache[key] = encoding
+            _validated_cache[key] = encoding
+            if key[2] <= TEXT_CACHE_MAX_BYTES:
+                _text_cache = (key, novel_text, encoding)
+        return novel_text, encoding
+    raise ValueError("Unable to read the novel file with any of the attempted encodings.")
+
+
+def read_novel_head(file_path: str, chars: int) -> Tuple[str, str]:
+    """
+    Read the beginning of a novel without decoding the whole file.
+
+    :param file_path: Path to the novel
+    :param chars: Number of characters to read
+    :return: (leading text, codec name)
+    """
+    key = _file_key(file_path)
+    with _lock:
+        if _text_cache is not None and _text_cache[0] == key:
+            return _text_cache[1][:chars], _text_cache[2]
+    encoding = detect_encoding(file_path)
+    with open(file_path, 'r', encoding=encoding, errors='replace') as file:
+        return file.read(chars), encoding
+
+
+def file_digest(file_path: str) -> str:
+    """
+    Hash the bytes of a novel, to tell whether a cache was built from this exact file.
+
+    :param file_path: Path to the novel
+    :return: Hex BLAKE2b digest, cached per path and modification time
+    """
+    key = _file_key(file_path)
+    with _lock:
+        digest = _digest_cache.get(key)
+    if digest:
+        return digest
+
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    digest = hasher.hexdigest()
+    with _lock:
+        _digest_cache[key] = digest
+    return digest
+
+
+def clear_cache() -> None:
+    global _text_cache
+    with _lock:
+        _encoding_cache.clear()
+        _validated_cache.clear()
+        _digest_cache.clear()
+        _text_cache = None
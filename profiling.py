@@ -0,0 +1,124 @@
+import os
+import io
+import time
+import atexit
+import pstats
+import logging
+import cProfile
+import functools
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+PROFILE_ENV_VAR = "QTBATCH_PROFILE"
+PROFILE_OUTPUT_ENV_VAR = "QTBATCH_PROFILE_OUTPUT"
+
+
+class Profiler:
+    """
+    Opt-in, run-wide profiler.
+
+    Disabled by default, in which case the conversion code only pays a boolean check per
+    paragraph. When enabled, it aggregates over the whole run:
+
+    - wall time and call count per pipeline stage (special_chars, matching, rephrase, ...)
+    - one cProfile.Profile shared by all top-level sessions (load_data, process_novel),
+      dumped as a pstats file at exit when an output path is set
+    """
+
+    def __init__(self):
+        self.enabled: bool = False
+        self.output_path: Optional[str] = None
+        self.stage_times: Dict[str, float] = defaultdict(float)
+        self.stage_calls: Dict[str, int] = defaultdict(int)
+        self._profile: Optional[cProfile.Profile] = None
+        self._session_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._atexit_registered = False
+
+    def enable(self, output_path: Optional[str] = None) -> None:
+        """
+        Turn profiling on for the rest of the run.
+
+        :param output_path: Optional path of the pstats file written at exit
+        """
+        self.enabled = True
+        self.output_path = output_path or self.output_path
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+        if not self._atexit_registered:
+            atexit.register(self.report)
+            self._atexit_registered = True
+        logging.info(f"Profiling enabled{f', writing stats to {self.output_path}' if self.output_path else ''}")
+
+    def enable_from_env(self) -> None:
+        if os.environ.get(PROFILE_ENV_VAR, "").lower() in ("1", "true", "yes", "on"):
+            self.enable(os.environ.get(PROFILE_OUTPUT_ENV_VAR) or None)
+
+    def add_stage_time(self, stage: str, seconds: float) -> None:
+        with self._stats_lock:
+            self.stage_times[stage] += seconds
+            self.stage_calls[stage] += 1
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def session(self, name: str):
+        """
+        Time a top-level operation and collect cProfile data for it.
+
+        cProfile only follows the thread that enables it, so sessions started while another
+        one is running on a different thread are timed but not added to the call profile.
+        """
+        owns_profile = self._profile is not None and self._session_lock.acquire(blocking=False)
+        if owns_profile:
+            self._profile.enable()
+        try:
+            with self.stage(name):
+                yield
+        finally:
+            if owns_profile:
+                self._profile.disable()
+                self._session_lock.release()
+
+    def summary(self, top: int = 25) -> str:
+        lines = ["Profiling summary (aggregated over the run):"]
+        with self._stats_lock:
+            for stage, seconds in sorted(self.stage_times.items(), key=lambda item: -item[1]):
+                lines.append(f"  {stage:<24} {seconds:10.3f}s  {self.stage_calls[stage]:>10} calls")
+        if self._profile is not None and self._profile.getstats():
+            buffer = io.StringIO()
+            pstats.Stats(self._profile, stream=buffer).sort_stats("cumulative").print_stats(top)
+            lines.append(buffer.getvalue())
+        return "\n".join(lines)
+
+    def report(self) -> None:
+        """Log the summary and, if an output path is set, dump the pstats file."""
+        if not self.enabled:
+            return
+        logging.info(self.summary())
+        if self.output_path and self._profile is not None and self._profile.getstats():
+            self._profile.dump_stats(self.output_path)
+            logging.info(f"Profile stats written to {self.output_path}")
+
+
+profiler = Profiler()
+profiler.enable_from_env()
+
+
+def profiled(func):
+    """Run func as a profiling session when profiling is enabled. Meant for top-level operations."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return func(*args, **kwargs)
+        with profiler.session(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,184 @@
+"""
+Headless batch conversion of novels.
+
+Loads the dictionaries once and converts every matching file across worker processes,
+skipping files whose output is newer than both the novel and the dictionaries.
+
+Usage:
+    python qtbatch_cli.py novels/ "more/**/*.txt" single.txt [--output-dir out] [--workers 8] [--force]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import logging
+import multiprocessing
+from concurrent.futures import as_completed
+from typing import Dict, List, Optional, Tuple
+
+import config
+import QuickTranslator as qt
+from profiling import profiler
+
+DICTIONARY_PATHS = [config.NAMES2_PATH, config.NAMES_PATH, config.VIET_PHRASE_PATH, config.CHINESE_PHIEN_AM_PATH]
+
+
+def collect_inputs(patterns: List[str], extension: str, recursive: bool) -> List[Tuple[str, str]]:
+    """
+    Expand files, directories and glob patterns into novel paths.
+
+    :param patterns: Command-line inputs
+    :param extension: File extension searched for inside directories
+    :param recursive: Also search subdirectories of directory inputs
+    :return: Sorted, de-duplicated (path, directory its relative output path is based on) pairs
+    """
+    found: Dict[str, str] = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            search = os.path.join(pattern, '**', f'*{extension}') if recursive else os.path.join(pattern, f'*{extension}')
+            for path in glob.glob(search, recursive=recursive):
+                found.setdefault(os.path.abspath(path), os.path.abspath(pattern))
+        else:
+            matches = glob.glob(pattern, recursive=True) or ([pattern] if os.path.isfile(pattern) else [])
+            if not matches:
+                logging.warning(f"No files match {pattern}")
+            for path in matches:
+                if os.path.isfile(path):
+                    found.setdefault(os.path.abspath(path), os.path.dirname(os.path.abspath(path)))
+    # Outputs written next to their novels (see convert_filename) are not novels themselves
+    return sorted((path, root) for path, root in found.items()
+                  if not os.path.splitext(path)[0].endswith('_Converted'))
+
+
+def output_path_for(input_path: str, root: str, output_dir: Optional[str], converted_name: str) -> str:
+    if output_dir is None:
+        return os.path.join(os.path.dirname(input_path), converted_name)
+    relative_dir = os.path.relpath(os.path.dirname(input_path), root)
+    return os.path.normpath(os.path.join(output_dir, relative_dir, converted_name))
+
+
+def find_output_collisions(planned: List[Tuple[str, str, str]]) -> Dict[str, List[str]]:
+    """
+    Find output paths planned for more than one novel, e.g. /a/x.txt and /b/x.txt with --output-dir.
+
+    :param planned: (input path, output path, fallback path) jobs
+    :return: {output path: input paths} for every shared output path
+    """
+    # Keyed by the normalized case, since case-insensitive file systems treat X.txt and x.txt as one file
+    inputs_by_output: Dict[str, Tuple[str, List[str]]] = {}
+    for input_path, output_path, _ in planned:
+        inputs_by_output.setdefault(os.path.normcase(output_path), (output_path, []))[1].append(input_path)
+    return {output_path: input_paths for output_path, input_paths in inputs_by_output.values() if len(input_paths) > 1}
+
+
+def is_up_to_date(input_path: str, output_path: str, dictionaries_mtime: float) -> bool:
+    if not os.path.exists(output_path):
+        return False
+    output_mtime = os.path.getmtime(output_path)
+    return output_mtime >= os.path.getmtime(input_path) and output_mtime >= dictionaries_mtime
+
+
+def format_rate(count: float, seconds: float) -> str:
+    return f"{count / seconds:.2f}" if seconds > 0 else "inf"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert directories of Chinese novels to Sino-Vietnamese")
+    parser.add_argument("inputs", nargs="+", help="Novel files, directories or glob patterns")
+    parser.add_argument("--output-dir", help="Write converted files here, mirroring directory inputs (default: next to each novel)")
+    parser.add_argument("--extension", default=".txt", help="File extension searched for inside directories")
+    parser.add_argument("--recursive", action="store_true", help="Search subdirectories of directory inputs")
+    parser.add_argument("--workers", type=int, default=config.CONVERSION_WORKERS, help="Worker processes")
+    parser.add_argument("--force", action="store_true", help="Convert even if the output is up to date")
+    parser.add_argument("--backend", choices=["trie", "array"], default=config.DICTIONARY_BACKEND)
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the compiled dictionary cache (array backend only)")
+    parser.add_argument("--profile", action="store_true", help="Profile loading and conversion")
+    parser.add_argument("--profile-output", help="Write aggregated pstats to this file at exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    if args.profile or args.profile_output:
+        profiler.enable(args.profile_output)
+
+    inputs = collect_inputs(args.inputs, args.extension, args.recursive)
+    if not inputs:
+        print("No novels found.")
+        return 1
+
+    start_time = time.perf_counter()
+    names2, names, viet_phrase, chinese_phien_am, _ = qt.load_data(
+        backend=args.backend, use_cache=config.DICTIONARY_CACHE and not args.no_cache,
+        parallel=config.DICTIONARY_PARALLEL_LOADING)
+    matcher = qt.get_matcher(names2, names, viet_phrase)
+    load_time = time.perf_counter() - start_time
+    print(f"Dictionaries loaded in {load_time:.2f}s")
+
+    dictionaries_mtime = max((os.path.getmtime(path) for path in DICTIONARY_PATHS if os.path.exists(path)), default=0)
+    planned: List[Tuple[str, str, str]] = []
+    for index, (input_path, root) in enumerate(inputs):
+        converted_name = qt.convert_filename(os.path.basename(input_path), names2, names, viet_phrase, chinese_phien_am)
+        output_path = output_path_for(input_path, root, args.output_dir, converted_name)
+        fallback_path = os.path.join(os.path.dirname(output_path), f"Converted_Novel_{index}_{int(time.time())}.txt")
+        planned.append((input_path, output_path, fallback_path))
+    collisions = find_output_collisions(planned)
+    if collisions:
+        for output_path, input_paths in collisions.items():
+            print(f"Output {output_path} would be written by several novels: {', '.join(input_paths)}")
+        print("Rename the novels or drop --output-dir so that every output is distinct.")
+        return 1
+    jobs = [job for job in planned if args.force or not is_up_to_date(job[0], job[1], dictionaries_mtime)]
+    skipped = len(planned) - len(jobs)
+    # Largest first, so one big novel does not end up alone at the tail of the run
+    jobs.sort(key=lambda job: -os.path.getsize(job[0]))
+    print(f"{len(planned)} novels found, {len(jobs)} to convert, {skipped} up to date")
+
+    total_bytes = 0
+    failed = 0
+    start_time = time.perf_counter()
+    workers = max(1, min(args.workers, len(jobs)))
+    if jobs:
+        for _, output_path, _ in jobs:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if workers == 1 or len(jobs) == 1:
+            # A single novel is split by paragraphs across the workers instead
+            workers = max(1, args.workers)
+            for index, (input_path, output_path, fallback_path) in enumerate(jobs, 1):
+                file_start = time.perf_counter()
+                try:
+                    written_path = qt.convert_file_with_matcher(input_path, output_path, matcher, chinese_phien_am,
+                                                                workers=args.workers, fallback_output_path=fallback_path)
+                except Exception as e:
+                    failed += 1
+                    print(f"[{index}/{len(jobs)}] FAILED {input_path}: {str(e)}")
+                    continue
+                total_bytes += os.path.getsize(input_path)
+                print(f"[{index}/{len(jobs)}] {os.path.basename(input_path)} -> {written_path} "
+                      f"({time.perf_counter() - file_start:.2f}s)")
+        else:
+            executor = qt.get_conversion_pool(matcher, chinese_phien_am, workers)
+            futures = {executor.submit(qt._convert_file_task, input_path, output_path, fallback_path): input_path
+                       for input_path, output_path, fallback_path in jobs}
+            for index, future in enumerate(as_completed(futures), 1):
+                input_path = futures[future]
+                try:
+                    written_path, seconds = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"[{index}/{len(jobs)}] FAILED {input_path}: {str(e)}")
+                    continue
+                total_bytes += os.path.getsize(input_path)
+                print(f"[{index}/{len(jobs)}] {os.path.basename(input_path)} -> {written_path} ({seconds:.2f}s)")
+        qt.shutdown_conversion_pool()
+    elapsed = time.perf_counter() - start_time
+
+    converted = len(jobs) - failed
+    print(f"Converted {converted} files ({total_bytes / 2**20:.1f} MB) in {elapsed:.2f}s with {workers} worker(s): "
+          f"{format_rate(converted, elapsed)} files/s, {format_rate(total_bytes / 2**20, elapsed)} MB/s; "
+          f"{skipped} up to date, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
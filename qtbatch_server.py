@@ -0,0 +1,286 @@
+"""
+Local conversion server with warm dictionaries.
+
+The dictionaries are loaded and compiled once at startup; every request after that only
+pays for the conversion itself. Requests are served concurrently, large paragraph batches
+go to the conversion process pool, and large bodies are converted and streamed back
+block by block.
+
+Endpoints (UTF-8 throughout):
+    POST /convert         plain text body, converted text back (chunked for large bodies)
+    POST /convert/batch   {"texts": [...]} -> {"results": [...]}
+    GET  /metrics         request counts, latency percentiles, throughput, cache stats
+    GET  /health
+
+Usage:
+    python qtbatch_server.py [--host 127.0.0.1] [--port 8765] [--workers 4]
+    curl --data-binary @chapter.txt http://127.0.0.1:8765/convert
+"""
+import io
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+import config
+import QuickTranslator as qt
+
+# Bodies larger than this are converted and sent back incrementally
+STREAM_THRESHOLD_BYTES = 1024 * 1024
+# Paragraph lists at least this long are converted on the process pool
+POOL_MIN_PARAGRAPHS = 400
+POOL_BATCH_SIZE = 200
+LATENCY_WINDOW = 10000
+
+
+class ServerMetrics:
+    """Request counters and a sliding window of latencies, safe to update from handler threads."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.chars_in = 0
+        self.chars_out = 0
+        self.busy_seconds = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, chars_in: int, chars_out: int, error: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.chars_in += chars_in
+            self.chars_out += chars_out
+            self.busy_seconds += seconds
+            self.latencies.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            uptime = time.time() - self.started
+            result = {
+                "uptime_seconds": round(uptime, 1),
+                "requests": self.requests,
+                "errors": self.errors,
+                "chars_in": self.chars_in,
+                "chars_out": self.chars_out,
+                "requests_per_second": round(self.requests / uptime, 3) if uptime else 0.0,
+                "chars_per_busy_second": round(self.chars_in / self.busy_seconds) if self.busy_seconds else 0,
+            }
+        for label, quantile in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            value = latencies[min(len(latencies) - 1, int(quantile * len(latencies)))] if latencies else 0.0
+            result[f"latency_{label}_ms"] = round(value * 1000, 2)
+        return result
+
+
+class ConversionService:
+    """Warm dictionaries plus the conversion entry points used by the request handlers."""
+
+    def __init__(self, names2, names, viet_phrase, chinese_phien_am: Dict[str, str], workers: int):
+        self.names2 = names2
+        self.names = names
+        self.viet_phrase = viet_phrase
+        self.chinese_phien_am = chinese_phien_am
+        self.workers = workers
+
+    @property
+    def matcher(self):
+        return qt.get_matcher(self.names2, self.names, self.viet_phrase)
+
+    def convert_paragraphs(self, paragraphs: List[str]) -> List[str]:
+        matcher = self.matcher
+        if self.workers > 1 and len(paragraphs) >= POOL_MIN_PARAGRAPHS:
+            return qt.convert_paragraphs_parallel(paragraphs, matcher, self.chinese_phien_am, self.workers,
+                                                  batch_size=POOL_BATCH_SIZE)
+        return [qt.cached_convert_text(paragraph, matcher, self.chinese_phien_am) for paragraph in paragraphs]
+
+    def convert(self, text: str) -> str:
+        """Convert a text paragraph by paragraph, the same way process_novel does."""
+        return '\n'.join(self.convert_paragraphs(text.split('\n')))
+
+    def convert_many(self, texts: List[str]) -> List[str]:
+        """Convert a batch of texts with one paragraph list, so the pool sees a single large job."""
+        split_texts = [text.split('\n') for text in texts]
+        converted = iter(self.convert_paragraphs([paragraph for paragraphs in split_texts for paragraph in paragraphs]))
+        return ['\n'.join(next(converted) for _ in paragraphs) for paragraphs in split_texts]
+
+
+class RequestBody(io.RawIOBase):
+    """Read exactly Content-Length bytes from the connection, so it can be wrapped in a TextIOWrapper."""
+
+    def __init__(self, rfile, length: int):
+        super().__init__()
+        self.rfile = rfile
+        self.remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.remaining <= 0:
+            return 0
+        data = self.rfile.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: 'ConversionServer'
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+    def send_body(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, payload: Any, status: int = 200) -> None:
+        self.send_body(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), "application/json; charset=utf-8")
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self.send_json({"status": "ok"})
+        elif self.path == "/metrics":
+            self.send_json({**self.server.metrics.snapshot(), "conversion_cache": qt.conversion_cache.stats()})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        if self.path not in ("/convert", "/convert/batch"):
+            self.send_json({"error": "not found"}, 404)
+            return
+        if "Content-Length" not in self.headers:
+            self.close_connection = True
+            self.send_json({"error": "Content-Length required"}, 411)
+            return
+
+        start = time.perf_counter()
+        chars_in = chars_out = 0
+        error = False
+        self.streaming = False
+        try:
+            length = self.content_length()
+            if self.path == "/convert/batch":
+                texts = json.loads(self.rfile.read(length).decode('utf-8'))["texts"]
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise ValueError('"texts" must be a list of strings')
+                results = self.server.service.convert_many(texts)
+                chars_in, chars_out = sum(map(len, texts)), sum(map(len, results))
+                self.send_json({"results": results})
+            elif length > STREAM_THRESHOLD_BYTES:
+                chars_in, chars_out = self.stream_conversion(length)
+            else:
+                text = self.rfile.read(length).decode('utf-8')
+                result = self.server.service.convert(text)
+                chars_in, chars_out = len(text), len(result)
+                self.send_body(200, result.encode('utf-8'), "text/plain; charset=utf-8")
+        except (ValueError, KeyError, TypeError) as e:
+            # UnicodeDecodeError and json.JSONDecodeError are ValueErrors
+            error = True
+            if self.streaming:
+                # The 200 status and part of the body are already out; a client can only tell
+                # the response is incomplete from the connection closing before the last chunk
+                logging.error(f"Error streaming conversion: {str(e)}")
+                self.close_connection = True
+            else:
+                self.send_json({"error": str(e)}, 400)
+        except Exception as e:
+            error = True
+            logging.error(f"Error converting request: {str(e)}")
+            self.close_connection = True
+        finally:
+            self.server.metrics.record(time.perf_counter() - start, chars_in, chars_out, error)
+
+    def content_length(self) -> int:
+        """Parse Content-Length, raising ValueError if it is not a non-negative integer."""
+        value = self.headers["Content-Length"]
+        try:
+            length = int(value)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Where the body ends is unknown, so the connection cannot be reused
+            self.close_connection = True
+            raise ValueError(f"Invalid Content-Length: {value!r}")
+        return length
+
+    def stream_conversion(self, length: int):
+        """Convert the body block by block and send each converted block as an HTTP chunk."""
+        reader = io.TextIOWrapper(io.BufferedReader(RequestBody(self.rfile, length)), encoding='utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.streaming = True
+        chars_in = chars_out = 0
+        first = True
+        for paragraphs in qt.iter_paragraph_blocks(reader):
+            converted = '\n'.join(self.server.service.convert_paragraphs(paragraphs))
+            if not first:
+                converted = '\n' + converted
+            first = False
+            chars_in += sum(map(len, paragraphs)) + len(paragraphs) - 1
+            chars_out += len(converted)
+            data = converted.encode('utf-8')
+            if data:
+                self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+        return chars_in, chars_out
+
+
+class ConversionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: ConversionService):
+        super().__init__(address, ConversionRequestHandler)
+        self.service = service
+        self.metrics = ServerMetrics()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve Sino-Vietnamese conversion with warm dictionaries")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=config.CONVERSION_WORKERS,
+                        help="Worker processes for large requests (1 converts on the request thread)")
+    parser.add_argument("--backend", choices=["trie", "array"], default=config.DICTIONARY_BACKEND)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    names2, names, viet_phrase, chinese_phien_am, _ = qt.load_data(
+        backend=args.backend, use_cache=config.DICTIONARY_CACHE, parallel=config.DICTIONARY_PARALLEL_LOADING)
+    service = ConversionService(names2, names, viet_phrase, chinese_phien_am, args.workers)
+    if args.workers > 1:
+        # Fork every worker now, while this is the only thread: a worker forked later from a
+        # handler thread could inherit a lock (conversion cache, logging) held by another one
+        # and deadlock. Running one task per worker makes the pool start all of them.
+        pool = qt.get_conversion_pool(service.matcher, chinese_phien_am, args.workers)
+        for future in [pool.submit(os.getpid) for _ in range(args.workers)]:
+            future.result()
+
+    server = ConversionServer((args.host, args.port), service)
+    logging.info(f"Serving conversions on http://{args.host}:{args.port} with {args.workers} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        qt.shutdown_conversion_pool()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,100 @@
+import re
+from typing import Callable, Iterator, Optional, Tuple
+
+# The NER model takes at most 126 tokens, and a Chinese token is at least one character
+MAX_SEGMENT_CHARS = 126
+
+# A sentence ends after its final punctuation and any closing quotes or brackets that follow it
+SENTENCE_END = re.compile(r'[。！？!?]+[”’」』）)]*')
+# Inside an overlong sentence, clauses end after these; a name never contains them
+CLAUSE_END = re.compile(r'[，、；：,;:…—]+[”’」』）)]*|\s+')
+
+Span = Tuple[int, int]
+
+
+def iter_sentence_spans(text: str) -> Iterator[Span]:
+    """
+    Yield the (start, end) offsets of the sentences of a text, covering it without gaps.
+
+    :param text: Paragraph or any other text
+    :return: Iterator of sentence spans
+    """
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        yield start, match.end()
+        start = match.end()
+    if start < len(text):
+        yield start, len(text)
+
+
+def split_span(text: str, start: int, end: int, max_chars: int = MAX_SEGMENT_CHARS) -> Iterator[Span]:
+    """
+    Split an overlong span into pieces of at most max_chars, cutting after clause punctuation.
+
+    Each piece runs to the last clause boundary that fits. Only a clause longer than
+    max_chars on its own is cut at a fixed length.
+
+    :return: Iterator of spans covering [start, end)
+    """
+    piece_start = start
+    previous_cut = None
+    cuts = [match.end() for match in CLAUSE_END.finditer(text, start, end)]
+    cuts.append(end)
+    for cut in cuts:
+        while cut - piece_start > max_chars:
+            if previous_cut is not None:
+                yield piece_start, previous_cut
+                piece_start = previous_cut
+                previous_cut = None
+            else:
+                yield piece_start, piece_start + max_chars
+                piece_start += max_chars
+        previous_cut = cut if cut > piece_start else None
+    if piece_start < end:
+        yield piece_start, end
+
+
+def iter_segment_spans(text: str, max_chars: int = MAX_SEGMENT_CHARS, pack: bool = True,
+                       keep: Optional[Callable[[str], bool]] = None) -> Iterator[Span]:
+    """
+    Yield model-sized segments of a text, lazily and without copying it.
+
+    Sentences longer than max_chars are split with split_span. With pack, consecutive short
+    sentences are merged into one segment while it stays within max_chars, so the model
+    sees fewer, fuller inputs.
+
+    :param text: Paragraph to segment
+    :param max_chars: Longest segment the model accepts
+    :param pack: Merge consecutive sentences
+    :param keep: Called with the text of each sentence or piece before packing; rejected ones
+                 are dropped and never packed across
+    :return: Iterator of segment spans, in text order
+    """
+    pending = None
+    for start, end in iter_sentence_spans(text):
+        pieces = [(start, end)] if end - start <= max_chars else split_span(text, start, end, max_chars)
+        for piece in pieces:
+            if keep is not None and not keep(text[piece[0]:piece[1]]):
+                if pending is not None:
+                    yield pending
+                    pending = None
+            elif not pack:
+                yield piece
+            elif pending is None:
+                pending = piece
+            elif piece[1] - pending[0] <= max_chars:
+                pending = (pending[0], piece[1])
+            else:
+                yield pending
+                pending = piece
+    if pending is not None:
+        yield pending
+
+
+def iter_segments(text: str, max_chars: int = MAX_SEGMENT_CHARS, pack: bool = True,
+                  keep: Optional[Callable[[str], bool]] = None) -> Iterator[str]:
+    """Yield the text of the segments from iter_segment_spans, skipping whitespace-only ones."""
+    for start, end in iter_segment_spans(text, max_chars, pack, keep):
+        segment = text[start:end]
+        if not segment.isspace():
+            yield segment
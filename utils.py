@@ -2,7 +2,8 @@ import os
 import requests
 import shutil
 import logging
-from typing import Tuple, List
+import threading
+from typing import Tuple, List, Callable, Optional
 import hanzidentifier
 
 def check_and_download_fonts(font_dir: str, fonts: List[Tuple[str, str, str]]) -> None:
@@ -70,4 +71,52 @@ def detect_chinese_script(text: str) -> str:
                 return "Mixed or Unknown Chinese Script"
     except Exception as e:
         logging.error(f"Error detecting Chinese script: {str(e)}")
-        return "Chinese (detection failed)"
\ No newline at end of file
+        return "Chinese (detection failed)"
+
+
+class FileWatcher:
+    """
+    Poll a file's modification time on a daemon thread and call back when it changes.
+
+    Polling keeps this free of platform-specific notification APIs; for a dictionary
+    edited by hand a one-second delay is not noticeable.
+    """
+
+    def __init__(self, path: str, callback: Callable[[], None], interval: float = 1.0):
+        """
+        :param path: File to watch
+        :param callback: Called on the watcher thread after each change
+        :param interval: Seconds between checks
+        """
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_signature = self._signature()
+
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=f"FileWatcher({self.path})", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            signature = self._signature()
+            if signature is None or signature == self._last_signature:
+                continue
+            self._last_signature = signature
+            try:
+                self.callback()
+            except Exception as e:
+                logging.error(f"Error handling change of {self.path}: {str(e)}")
+